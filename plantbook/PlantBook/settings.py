@@ -146,13 +146,125 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Cache configuration
+# The default cache is shared by all gunicorn workers so API responses fetched
+# by one worker are hits in the others. Workers also coordinate through it
+# (single-flight locks, suggestion index changes), which needs add() and incr()
+# to be atomic across processes. CACHE_BACKEND selects the store:
+#   file     - a directory at CACHE_LOCATION shared by every process on the host;
+#              add() and incr() take a file lock (default)
+#   redis    - a Redis-compatible server at CACHE_LOCATION, e.g. redis://127.0.0.1:6379/1,
+#              for workers spread over several hosts
+#   locmem   - per-process memory, for tests and single-process development servers
+# The database cache is not offered: it writes inside each request's
+# ATOMIC_REQUESTS transaction, hidden from other workers until it commits.
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'file')
+CACHE_BACKENDS = {
+    'file': ('main.cache_backends.MeteredFileBasedCache', os.path.join(BASE_DIR, '.cache', 'default')),
+    'redis': ('main.cache_backends.MeteredRedisCache', 'redis://127.0.0.1:6379/1'),
+    'locmem': ('main.cache_backends.MeteredLocMemCache', 'unique-snowflake'),
+}
+if CACHE_BACKEND not in CACHE_BACKENDS:
+    raise ValueError(f"CACHE_BACKEND must be one of: {', '.join(CACHE_BACKENDS)}")
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
-    }
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': os.getenv('CACHE_LOCATION', CACHE_BACKENDS[CACHE_BACKEND][1]),
+        'TIMEOUT': 3600,
+        # Redis evicts by its own maxmemory policy; the others cull themselves
+        'OPTIONS': {} if CACHE_BACKEND == 'redis' else {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '50000')),
+        },
+    },
+    # Moderation verdicts keyed by image content hash; survives restarts
+    'moderation': {
+        'BACKEND': 'main.cache_backends.MeteredFileBasedCache',
+        'LOCATION': os.getenv('MODERATION_CACHE_DIR', os.path.join(BASE_DIR, '.cache', 'moderation')),
+        'TIMEOUT': 60 * 60 * 24 * 30,  # 30 days
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('MODERATION_CACHE_MAX_ENTRIES', '100000')),
+        },
+    },
 }
 
+# Image moderation (NSFW detection)
+MODERATION_DETECTOR_POOL_SIZE = int(os.getenv('MODERATION_DETECTOR_POOL_SIZE', '2'))
+MODERATION_DETECTOR_TIMEOUT = float(os.getenv('MODERATION_DETECTOR_TIMEOUT', '30'))
+# Queue uploads for the moderation_worker command instead of checking them inline
+MODERATION_ASYNC = os.getenv('MODERATION_ASYNC', 'True') == 'True'
+# The worker scores up to MODERATION_BATCH_SIZE images per inference call, waiting
+# at most MODERATION_BATCH_TIMEOUT seconds for a partial batch to fill. Batching
+# measured slower on a single core (21.2 images/sec unbatched, 19.9 at 8, 18.7
+# at 32), so it is off unless benchmark_moderation shows a gain on the host
+MODERATION_BATCH_SIZE = int(os.getenv('MODERATION_BATCH_SIZE', '1'))
+MODERATION_BATCH_TIMEOUT = float(os.getenv('MODERATION_BATCH_TIMEOUT', '0.5'))
+# Load the detector models when the worker boots instead of on the first upload
+MODERATION_WARM_UP = os.getenv('MODERATION_WARM_UP', 'False') == 'True'
+
+# Keep typical phone photos in memory so moderation never spills them to a temp file
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(os.getenv('FILE_UPLOAD_MAX_MEMORY_SIZE', str(15 * 1024 * 1024)))
+
+# Outbound HTTP (Trefle, PermaPeople, Wikipedia): timeouts in seconds and retry policy
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '15'))
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', '2'))
+HTTP_RETRY_BACKOFF = float(os.getenv('HTTP_RETRY_BACKOFF', '0.3'))
+# Number of hosts to keep pools for, and connections kept alive per host
+HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', '10'))
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '16'))
+
+# PermaPeople search: concurrent detail lookups and the overall deadline in seconds
+PERMAPEOPLE_MAX_WORKERS = int(os.getenv('PERMAPEOPLE_MAX_WORKERS', '8'))
+PERMAPEOPLE_SEARCH_TIMEOUT = float(os.getenv('PERMAPEOPLE_SEARCH_TIMEOUT', '10'))
+# Complete search result lists are cached briefly so bursts of the same query are served once
+PERMAPEOPLE_SEARCH_CACHE_TTL = int(os.getenv('PERMAPEOPLE_SEARCH_CACHE_TTL', '300'))
+# Plant records are fresh for PERMAPEOPLE_CACHE_TTL seconds, then served stale
+# for up to PERMAPEOPLE_CACHE_STALE_TTL more while they are refreshed
+PERMAPEOPLE_CACHE_TTL = int(os.getenv('PERMAPEOPLE_CACHE_TTL', '3600'))
+PERMAPEOPLE_CACHE_STALE_TTL = int(os.getenv('PERMAPEOPLE_CACHE_STALE_TTL', '86400'))
+
+# Wikipedia image lookups are cached for a week, names without an image for a day
+WIKIPEDIA_IMAGE_CACHE_TTL = int(os.getenv('WIKIPEDIA_IMAGE_CACHE_TTL', str(60 * 60 * 24 * 7)))
+WIKIPEDIA_NO_IMAGE_CACHE_TTL = int(os.getenv('WIKIPEDIA_NO_IMAGE_CACHE_TTL', str(60 * 60 * 24)))
+
+# Trefle token validity is re-checked after this many seconds (sooner once it has
+# failed or Trefle was unreachable)
+TREFLE_TOKEN_CHECK_INTERVAL = int(os.getenv('TREFLE_TOKEN_CHECK_INTERVAL', str(60 * 60 * 6)))
+TREFLE_TOKEN_RECHECK_INTERVAL = int(os.getenv('TREFLE_TOKEN_RECHECK_INTERVAL', '300'))
+
+# Trefle responses are cached for TREFLE_CACHE_TTL seconds, 404s and empty searches
+# for TREFLE_NEGATIVE_CACHE_TTL. Bump TREFLE_CACHE_VERSION to drop every cached response
+TREFLE_CACHE_TTL = int(os.getenv('TREFLE_CACHE_TTL', '3600'))
+TREFLE_NEGATIVE_CACHE_TTL = int(os.getenv('TREFLE_NEGATIVE_CACHE_TTL', '600'))
+TREFLE_CACHE_VERSION = int(os.getenv('TREFLE_CACHE_VERSION', '1'))
+
+# Concurrent identical API calls share one upstream request. A worker holds the
+# shared lock for at most SINGLE_FLIGHT_LOCK_TIMEOUT seconds; the others wait up to
+# SINGLE_FLIGHT_WAIT_TIMEOUT seconds for its result before fetching themselves
+SINGLE_FLIGHT_LOCK_TIMEOUT = int(os.getenv('SINGLE_FLIGHT_LOCK_TIMEOUT', '30'))
+SINGLE_FLIGHT_WAIT_TIMEOUT = float(os.getenv('SINGLE_FLIGHT_WAIT_TIMEOUT', '20'))
+
+# Ranked matches per page of a local plant search
+SEARCH_RESULTS_LIMIT = int(os.getenv('SEARCH_RESULTS_LIMIT', '24'))
+
+# Plants per page on my_plants and user profiles
+PLANTS_PER_PAGE = int(os.getenv('PLANTS_PER_PAGE', '24'))
+
+# Items per page on each plant_detail tab
+PLANT_TAB_PAGE_SIZE = int(os.getenv('PLANT_TAB_PAGE_SIZE', '20'))
+
+# How long rendered plant page fragments are kept. Changes to a plant replace
+# its fragments straight away, so this only bounds how long unused ones linger
+PLANT_FRAGMENT_CACHE_TTL = int(os.getenv('PLANT_FRAGMENT_CACHE_TTL', str(24 * 60 * 60)))
+
+# Typeahead suggestions: matches returned per keystroke, and how often (in
+# seconds) each worker checks the shared cache for plants changed by others
+SUGGEST_RESULTS_LIMIT = int(os.getenv('SUGGEST_RESULTS_LIMIT', '8'))
+SUGGEST_INDEX_SYNC_INTERVAL = float(os.getenv('SUGGEST_INDEX_SYNC_INTERVAL', '1'))
+
+# /health/ is open to staff, and to monitors sending this as a bearer token
+HEALTH_CHECK_TOKEN = os.getenv('HEALTH_CHECK_TOKEN', '')
+
 # Login URL configuration
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'home'
@@ -11,6 +11,11 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'PlantBook.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'plantbook.PlantBook.settings')
 
 application = get_asgi_application()
+
+# Load the typeahead index in each worker before it takes requests
+from main.suggest import plant_suggestions  # noqa: E402
+
+plant_suggestions.warm_up()
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.conf import settings
 from django.core.files.storage import default_storage
 import logging
 
@@ -11,8 +12,18 @@ class MainConfig(AppConfig):
 
     def ready(self):
         logger.info("Initializing MainConfig")
+        # Connects the signal handlers that keep the counters, search indexes
+        # and cached page fragments current
+        from . import counters, fragments, search, suggest  # noqa: F401
         try:
             logger.info(f"Default storage backend: {default_storage.__class__.__name__}")
             logger.info(f"Storage backend configuration: {default_storage.__dict__}")
         except Exception as e:
             logger.error(f"Error initializing storage backend: {str(e)}")
+
+        if settings.MODERATION_WARM_UP:
+            try:
+                from .moderation import detector_pool
+                detector_pool.warm_up()
+            except Exception as e:
+                logger.error(f"Error warming up moderation detectors: {str(e)}")
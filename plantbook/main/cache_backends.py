@@ -0,0 +1,175 @@
+import logging
+import os
+import pickle
+import re
+import threading
+import time
+import zlib
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from django.core.files import locks
+
+logger = logging.getLogger(__name__)
+
+# "permapeople_plant_42" -> "permapeople_plant", "verdict:ab12..." -> "verdict"
+NAMESPACE_RE = re.compile(r'^[A-Za-z]+(?:_[A-Za-z]+)?')
+
+_MISSING = object()
+
+
+def key_namespace(key):
+    """Group a cache key with others of its kind for the hit-rate metrics"""
+    match = NAMESPACE_RE.match(str(key))
+    return match.group(0) if match else 'other'
+
+
+class CacheMetrics:
+    """Per-process hit and miss counters, grouped by key namespace."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = defaultdict(lambda: [0, 0])
+
+    def record(self, namespace, hits=0, misses=0):
+        with self._lock:
+            counts = self._counts[namespace]
+            counts[0] += hits
+            counts[1] += misses
+
+    def snapshot(self):
+        with self._lock:
+            counts = {namespace: tuple(value) for namespace, value in self._counts.items()}
+        stats = {}
+        for namespace, (hits, misses) in sorted(counts.items()):
+            lookups = hits + misses
+            stats[namespace] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': round(hits / lookups, 3) if lookups else None,
+            }
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+class MeteredCacheMixin:
+    """Counts hits and misses of get() and get_many() per key namespace.
+
+    Counters live in the worker process; the health view reports them with
+    the worker's pid so they can be told apart.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = CacheMetrics()
+        self._metering = threading.local()
+
+    @contextmanager
+    def _outermost(self):
+        # Backends implement get() with get_many() or the other way round;
+        # only the outermost call records, so each lookup is counted once
+        depth = getattr(self._metering, 'depth', 0)
+        self._metering.depth = depth + 1
+        try:
+            yield depth == 0
+        finally:
+            self._metering.depth = depth
+
+    def get(self, key, default=None, version=None):
+        with self._outermost() as outermost:
+            value = super().get(key, _MISSING, version)
+        if value is _MISSING:
+            if outermost:
+                self.metrics.record(key_namespace(key), misses=1)
+            return default
+        if outermost:
+            self.metrics.record(key_namespace(key), hits=1)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        with self._outermost() as outermost:
+            found = super().get_many(keys, version)
+        if outermost:
+            for key in keys:
+                if key in found:
+                    self.metrics.record(key_namespace(key), hits=1)
+                else:
+                    self.metrics.record(key_namespace(key), misses=1)
+        return found
+
+    def stats(self):
+        return {
+            'backend': type(self).__name__,
+            'pid': os.getpid(),
+            'namespaces': self.metrics.snapshot(),
+        }
+
+
+class MeteredFileBasedCache(MeteredCacheMixin, FileBasedCache):
+    """A cache directory shared by every process on the host.
+
+    add() and incr() hold an exclusive lock on a file in the directory, so
+    they are atomic across processes as the single-flight locks and the
+    suggestion index versions need. Culling lists the whole directory, so
+    each process culls at most once every ``cull_interval`` seconds rather
+    than on every write.
+    """
+    cull_interval = 60
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock_path = os.path.join(self._dir, 'atomic.lock')
+        self._next_cull = 0.0
+
+    @contextmanager
+    def _exclusive(self):
+        self._createdir()
+        with open(self._lock_path, 'ab') as f:
+            locks.lock(f, locks.LOCK_EX)
+            try:
+                yield
+            finally:
+                locks.unlock(f)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._exclusive():
+            return super().add(key, value, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        with self._exclusive():
+            try:
+                with open(self._key_to_file(key, version), 'rb') as f:
+                    expiry = pickle.load(f)
+                    if expiry is not None and expiry < time.time():
+                        raise FileNotFoundError
+                    value = pickle.loads(zlib.decompress(f.read()))
+            except (FileNotFoundError, EOFError):
+                raise ValueError(f"Key '{key}' not found")
+            # Keep the key's expiry rather than resetting it to the default timeout
+            timeout = None if expiry is None else max(expiry - time.time(), 0.001)
+            value += delta
+            self.set(key, value, timeout, version)
+            return value
+
+    def _cull(self):
+        now = time.monotonic()
+        if now < self._next_cull:
+            return
+        self._next_cull = now + self.cull_interval
+        super()._cull()
+
+
+class MeteredRedisCache(MeteredCacheMixin, RedisCache):
+    pass
+
+
+class MeteredLocMemCache(MeteredCacheMixin, LocMemCache):
+    pass
@@ -0,0 +1,117 @@
+"""Denormalized counters: Profile.plant_count, Plant.like_count and Plant.comment_count.
+
+Signals adjust the counters with single ``UPDATE ... SET n = n + 1``
+statements, so concurrent writers never overwrite each other's changes.
+Bulk inserts send no signals and call add_plants() themselves. recount()
+recomputes every counter from the underlying rows; ``manage.py recount``
+uses it to repair drift.
+"""
+import logging
+from functools import reduce
+from operator import or_
+
+from django.contrib.auth.models import User
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Comment, Plant, Profile
+
+logger = logging.getLogger(__name__)
+
+PlantLike = Plant.likes.through
+
+
+def _count(queryset, field, outer='pk'):
+    """Number of rows in ``queryset`` whose ``field`` matches the outer row's ``outer``"""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef(outer)}).order_by().values(field).annotate(n=Count('*')).values('n')
+        ),
+        Value(0),
+    )
+
+
+def _counts():
+    return {
+        Profile: {'plant_count': _count(Plant.objects.all(), 'owner', outer='user')},
+        Plant: {
+            'like_count': _count(PlantLike.objects.all(), 'plant'),
+            'comment_count': _count(Comment.objects.all(), 'plant'),
+        },
+    }
+
+
+def add_plants(owner_id, count=1):
+    Profile.objects.filter(user_id=owner_id).update(plant_count=F('plant_count') + count)
+
+
+def recount_likes(plant_ids):
+    Plant.objects.filter(pk__in=plant_ids).update(like_count=_counts()[Plant]['like_count'])
+
+
+def recount(batch_size=1000):
+    """Correct every counter that disagrees with its rows; returns the number of rows fixed per model"""
+    fixed = {}
+    for model, counts in _counts().items():
+        actual = {f'actual_{field}': expression for field, expression in counts.items()}
+        stale = reduce(or_, (~Q(**{field: F(f'actual_{field}')}) for field in counts))
+        ids = list(model.objects.annotate(**actual).filter(stale).values_list('pk', flat=True))
+        for i in range(0, len(ids), batch_size):
+            model.objects.filter(pk__in=ids[i:i + batch_size]).update(**counts)
+        fixed[model.__name__] = len(ids)
+        if ids:
+            logger.warning(f"Recounted {len(ids)} {model._meta.verbose_name_plural} with drifted counters")
+    return fixed
+
+
+@receiver(post_save, sender=Plant)
+def _plant_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        add_plants(instance.owner_id)
+
+
+@receiver(post_delete, sender=Plant)
+def _plant_deleted(sender, instance, **kwargs):
+    Profile.objects.filter(user_id=instance.owner_id, plant_count__gt=0).update(plant_count=F('plant_count') - 1)
+
+
+@receiver(post_save, sender=Comment)
+def _comment_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Plant.objects.filter(pk=instance.plant_id).update(comment_count=F('comment_count') + 1)
+
+
+@receiver(post_delete, sender=Comment)
+def _comment_deleted(sender, instance, **kwargs):
+    Plant.objects.filter(pk=instance.plant_id, comment_count__gt=0).update(comment_count=F('comment_count') - 1)
+
+
+@receiver(m2m_changed, sender=PlantLike)
+def _likes_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # Forward: plant.likes.add(*users); reverse: user.liked_plants.add(*plants)
+    if action == 'post_add' and pk_set:
+        # pk_set holds only the rows actually inserted
+        if reverse:
+            Plant.objects.filter(pk__in=pk_set).update(like_count=F('like_count') + 1)
+        else:
+            Plant.objects.filter(pk=instance.pk).update(like_count=F('like_count') + len(pk_set))
+    elif action == 'post_remove' and pk_set:
+        # pk_set holds what was asked for, which may include rows that never existed
+        recount_likes(pk_set if reverse else [instance.pk])
+    elif action == 'pre_clear' and reverse:
+        instance._cleared_plant_ids = list(instance.liked_plants.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        recount_likes(instance.__dict__.pop('_cleared_plant_ids', []) if reverse else [instance.pk])
+
+
+# Deleting a user removes their likes without any m2m_changed signal
+@receiver(pre_delete, sender=User)
+def _user_deleting(sender, instance, **kwargs):
+    instance._liked_plant_ids = list(instance.liked_plants.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=User)
+def _user_deleted(sender, instance, **kwargs):
+    recount_likes(instance.__dict__.pop('_liked_plant_ids', []))
@@ -1,22 +1,96 @@
 from django import forms
-from .models import Plant, Observation, PlantPhoto, Profile, Comment, Message
-from nudenet import NudeDetector
-import tempfile
-import os
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from .models import Plant, Observation, PlantPhoto, Profile, Comment, Message, MODERATION_PENDING
+from .moderation import read_upload, is_nsfw, queue_for_moderation
 import logging
 from django.core.files.base import ContentFile
 from PIL import Image
 import io
 from django.core.files.storage import default_storage
 import cloudinary
+import cloudinary.uploader
 import time
 from cloudinary.forms import CloudinaryFileField
-import requests
-import numpy as np
-import cv2
 
 logger = logging.getLogger(__name__)
 
+class ModeratedCloudinaryFileField(CloudinaryFileField):
+    """CloudinaryFileField that runs NSFW detection before uploading.
+
+    The uploaded bytes are checked in memory, so rejected images never
+    reach Cloudinary and accepted ones are not downloaded back. With
+    MODERATION_ASYNC enabled the upload is returned as-is and detection is
+    left to the moderation worker (see ModeratedImageFormMixin).
+    """
+
+    def to_python(self, value):
+        value = forms.FileField.to_python(self, value)
+        if not value:
+            return None
+
+        if settings.MODERATION_ASYNC:
+            # Only check that it is an image; the worker does the rest
+            try:
+                Image.open(value).verify()
+            except Exception:
+                raise forms.ValidationError("Invalid image format")
+            finally:
+                value.seek(0)
+            return value
+
+        try:
+            nsfw_detected = is_nsfw(read_upload(value))
+        except Exception as e:
+            logger.error(f"Error processing {self.options.get('folder', 'image')} upload: {str(e)}")
+            raise forms.ValidationError(f"Error processing image: {str(e)}")
+
+        if nsfw_detected:
+            raise forms.ValidationError("This image contains inappropriate content and cannot be uploaded.")
+
+        if self.autosave:
+            return cloudinary.uploader.upload_image(value, **self.options)
+        return value
+
+class ModeratedImageFormMixin:
+    """Holds a new upload back until the moderation worker has approved it.
+
+    The instance keeps its currently published image (if any) and is marked
+    pending. Views saving with ``commit=False`` must call ``queue_moderation``
+    once the instance has been saved.
+    """
+    moderated_field = 'image'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._published_image = getattr(self.instance, self.moderated_field)
+        self._pending_upload = None
+
+    def save(self, commit=True):
+        upload = self.cleaned_data.get(self.moderated_field)
+        if isinstance(upload, UploadedFile):
+            self._pending_upload = upload
+            setattr(self.instance, self.moderated_field, self._published_image)
+            self.instance.moderation_status = MODERATION_PENDING
+
+        instance = super().save(commit=commit)
+        if commit:
+            self.queue_moderation()
+        return instance
+
+    def queue_moderation(self):
+        """Queue the held-back upload for the saved instance."""
+        if self._pending_upload is None:
+            return None
+        job = queue_for_moderation(
+            self.instance,
+            self.moderated_field,
+            read_upload(self._pending_upload),
+            self.fields[self.moderated_field].options,
+        )
+        self._pending_upload = None
+        return job
+
 class PlantForm(forms.ModelForm):
     """Form for creating and editing plants."""
     plant_photo = CloudinaryFileField(
@@ -34,9 +108,9 @@ class PlantForm(forms.ModelForm):
             'description': forms.Textarea(attrs={'rows': 5}),
         }
 
-class ObservationForm(forms.ModelForm):
+class ObservationForm(ModeratedImageFormMixin, forms.ModelForm):
     """Form for creating observations."""
-    image = CloudinaryFileField(
+    image = ModeratedCloudinaryFileField(
         options={
             'folder': 'plantbook/observations',
             'resource_type': 'image',
@@ -59,80 +133,9 @@ class ObservationForm(forms.ModelForm):
             'image': 'Optional: Upload an image for your observation'
         }
 
-    def clean_image(self):
-        image = self.cleaned_data.get('image')
-        if image:
-            try:
-                # Get the image URL from Cloudinary
-                image_url = image.url
-                
-                # Download the image
-                response = requests.get(image_url)
-                if response.status_code != 200:
-                    raise forms.ValidationError("Failed to download image")
-                
-                # Convert the image data to a numpy array
-                image_data = np.frombuffer(response.content, np.uint8)
-                img = cv2.imdecode(image_data, cv2.IMREAD_COLOR)
-                
-                if img is None:
-                    raise forms.ValidationError("Invalid image format")
-                
-                # Save the image temporarily
-                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.jpg')
-                cv2.imwrite(temp_file.name, img)
-                
-                try:
-                    # Run NSFW detection
-                    detector = NudeDetector()
-                    result = detector.detect(temp_file.name)
-                    
-                    # Log detection results
-                    logger.info(f"NSFW detection results: {result}")
-                    
-                    # Check if any NSFW content was detected
-                    nsfw_detected = False
-                    for detection in result:
-                        # Log each detection
-                        logger.info(f"Detected: {detection['class']} with confidence: {detection['score']}")
-                        
-                        # Check for NSFW content with confidence threshold
-                        if detection['score'] > 0.2:  # Adjust this threshold as needed
-                            if detection['class'] in [
-                                'NSFW',
-                                'EXPOSED_BREAST_F',
-                                'EXPOSED_GENITALIA_F',
-                                'EXPOSED_GENITALIA_M',
-                                'EXPOSED_ANUS',
-                                'EXPOSED_BUTTOCKS',
-                                'EXPOSED_FEET',
-                                'EXPOSED_BREAST_M',
-                                'FEMALE_GENITALIA_EXPOSED',
-                                'MALE_GENITALIA_EXPOSED',
-                                'FEMALE_BREAST_EXPOSED',
-                                'MALE_BREAST_EXPOSED',
-                                'BELLY_EXPOSED'
-                            ]:
-                                nsfw_detected = True
-                                logger.warning(f"NSFW content detected: {detection['class']}")
-                                break
-                    
-                    if nsfw_detected:
-                        raise forms.ValidationError("This image contains inappropriate content and cannot be uploaded.")
-                    
-                finally:
-                    # Clean up the temporary file
-                    os.unlink(temp_file.name)
-                
-            except Exception as e:
-                logger.error(f"Error processing observation image: {str(e)}")
-                raise forms.ValidationError(f"Error processing image: {str(e)}")
-        
-        return image
-
-class PhotoForm(forms.ModelForm):
+class PhotoForm(ModeratedImageFormMixin, forms.ModelForm):
     """Form for adding photos to a plant."""
-    image = CloudinaryFileField(
+    image = ModeratedCloudinaryFileField(
         options={
             'folder': 'plantbook/photos',
             'resource_type': 'image',
@@ -155,79 +158,9 @@ class PhotoForm(forms.ModelForm):
             'caption': 'Optional: Add a caption for your photo'
         }
 
-    def clean_image(self):
-        image = self.cleaned_data.get('image')
-        if image:
-            try:
-                # Get the image URL from Cloudinary
-                image_url = image.url
-                
-                # Download the image
-                response = requests.get(image_url)
-                if response.status_code != 200:
-                    raise forms.ValidationError("Failed to download image")
-                
-                # Convert the image data to a numpy array
-                image_data = np.frombuffer(response.content, np.uint8)
-                img = cv2.imdecode(image_data, cv2.IMREAD_COLOR)
-                
-                if img is None:
-                    raise forms.ValidationError("Invalid image format")
-                
-                # Save the image temporarily
-                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.jpg')
-                cv2.imwrite(temp_file.name, img)
-                
-                try:
-                    # Run NSFW detection
-                    detector = NudeDetector()
-                    result = detector.detect(temp_file.name)
-                    
-                    # Log detection results
-                    logger.info(f"NSFW detection results: {result}")
-                    
-                    # Check if any NSFW content was detected
-                    nsfw_detected = False
-                    for detection in result:
-                        # Log each detection
-                        logger.info(f"Detected: {detection['class']} with confidence: {detection['score']}")
-                        
-                        # Check for NSFW content with confidence threshold
-                        if detection['score'] > 0.2:  # Adjust this threshold as needed
-                            if detection['class'] in [
-                                'NSFW',
-                                'EXPOSED_BREAST_F',
-                                'EXPOSED_GENITALIA_F',
-                                'EXPOSED_GENITALIA_M',
-                                'EXPOSED_ANUS',
-                                'EXPOSED_BUTTOCKS',
-                                'EXPOSED_FEET',
-                                'EXPOSED_BREAST_M',
-                                'FEMALE_GENITALIA_EXPOSED',
-                                'MALE_GENITALIA_EXPOSED',
-                                'FEMALE_BREAST_EXPOSED',
-                                'MALE_BREAST_EXPOSED',
-                                'BELLY_EXPOSED'
-                            ]:
-                                nsfw_detected = True
-                                logger.warning(f"NSFW content detected: {detection['class']}")
-                                break
-                    
-                    if nsfw_detected:
-                        raise forms.ValidationError("This image contains inappropriate content and cannot be uploaded.")
-                    
-                finally:
-                    # Clean up the temporary file
-                    os.unlink(temp_file.name)
-                
-            except Exception as e:
-                logger.error(f"Error processing photo image: {str(e)}")
-                raise forms.ValidationError(f"Error processing image: {str(e)}")
-        
-        return image
-
-class ProfileForm(forms.ModelForm):
-    profile_photo = CloudinaryFileField(
+class ProfileForm(ModeratedImageFormMixin, forms.ModelForm):
+    moderated_field = 'profile_photo'
+    profile_photo = ModeratedCloudinaryFileField(
         options={
             'folder': 'plantbook/profiles',
             'resource_type': 'image',
@@ -240,81 +173,11 @@ class ProfileForm(forms.ModelForm):
         model = Profile
         fields = ['bio', 'location', 'profile_photo']
 
-    def clean_profile_photo(self):
-        photo = self.cleaned_data.get('profile_photo')
-        if photo:
-            try:
-                # Get the image URL from Cloudinary
-                image_url = photo.url
-                
-                # Download the image
-                response = requests.get(image_url)
-                if response.status_code != 200:
-                    raise forms.ValidationError("Failed to download image")
-                
-                # Convert the image data to a numpy array
-                image_data = np.frombuffer(response.content, np.uint8)
-                img = cv2.imdecode(image_data, cv2.IMREAD_COLOR)
-                
-                if img is None:
-                    raise forms.ValidationError("Invalid image format")
-                
-                # Save the image temporarily
-                temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.jpg')
-                cv2.imwrite(temp_file.name, img)
-                
-                try:
-                    # Run NSFW detection
-                    detector = NudeDetector()
-                    result = detector.detect(temp_file.name)
-                    
-                    # Log detection results
-                    logger.info(f"NSFW detection results: {result}")
-                    
-                    # Check if any NSFW content was detected
-                    nsfw_detected = False
-                    for detection in result:
-                        # Log each detection
-                        logger.info(f"Detected: {detection['class']} with confidence: {detection['score']}")
-                        
-                        # Check for NSFW content with confidence threshold
-                        if detection['score'] > 0.2:  # Adjust this threshold as needed
-                            if detection['class'] in [
-                                'NSFW',
-                                'EXPOSED_BREAST_F',
-                                'EXPOSED_GENITALIA_F',
-                                'EXPOSED_GENITALIA_M',
-                                'EXPOSED_ANUS',
-                                'EXPOSED_BUTTOCKS',
-                                'EXPOSED_FEET',
-                                'EXPOSED_BREAST_M',
-                                'FEMALE_GENITALIA_EXPOSED',
-                                'MALE_GENITALIA_EXPOSED',
-                                'FEMALE_BREAST_EXPOSED',
-                                'MALE_BREAST_EXPOSED',
-                                'BELLY_EXPOSED'
-                            ]:
-                                nsfw_detected = True
-                                logger.warning(f"NSFW content detected: {detection['class']}")
-                                break
-                    
-                    if nsfw_detected:
-                        raise forms.ValidationError("This image contains inappropriate content and cannot be uploaded.")
-                    
-                finally:
-                    # Clean up the temporary file
-                    os.unlink(temp_file.name)
-                
-            except Exception as e:
-                logger.error(f"Error processing profile photo: {str(e)}")
-                raise forms.ValidationError(f"Error processing image: {str(e)}")
-        
-        return photo
-
     def save(self, commit=True):
         instance = super().save(commit=False)
         if commit:
             instance.save()
+            self.queue_moderation()
         return instance
 
 class CommentForm(forms.ModelForm):
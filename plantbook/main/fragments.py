@@ -0,0 +1,81 @@
+"""Cached fragments of plant pages.
+
+Fragments are cached under the plant's fragment_version, which Plant.save()
+and the signals below increment in the database whenever the plant or
+anything shown with it changes, so a stale fragment is never read again and
+simply expires. The increment is an ``UPDATE ... SET n = n + 1`` inside the
+writer's transaction: concurrent writers each move the version on, and no
+request sees the new version before the change that goes with it. Comments
+show their author's name and photo, so renaming a user or changing their
+photo bumps every plant they have commented on.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .models import Comment, Observation, Plant, PlantDetail, PlantPhoto, Profile
+
+logger = logging.getLogger(__name__)
+
+FRAGMENT_KEY = 'plant_fragment:{}:{}:{}'
+# What cached comments show of their authors
+AUTHOR_FIELDS = {User: ('username', 'first_name', 'last_name'), Profile: ('profile_photo',)}
+
+
+def bump_plant_version(plant_id):
+    """Invalidate the plant's cached fragments as part of the current transaction"""
+    Plant.objects.filter(pk=plant_id).update(fragment_version=F('fragment_version') + 1)
+    logger.debug(f"Bumped fragment version of plant {plant_id}")
+
+
+def cached_fragment(plant, name, render):
+    """The result of ``render()``, cached under the plant's fragment version as loaded"""
+    key = FRAGMENT_KEY.format(plant.pk, plant.fragment_version, name)
+    value = cache.get(key)
+    if value is None:
+        value = render()
+        cache.set(key, value, settings.PLANT_FRAGMENT_CACHE_TTL)
+    return value
+
+
+@receiver(post_save, sender=PlantDetail)
+@receiver(post_delete, sender=PlantDetail)
+@receiver(post_save, sender=PlantPhoto)
+@receiver(post_delete, sender=PlantPhoto)
+@receiver(post_save, sender=Observation)
+@receiver(post_delete, sender=Observation)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def _plant_item_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_plant_version(instance.plant_id)
+
+
+def _author_state(instance):
+    # Read from __dict__ so deferred fields are not loaded
+    return tuple(str(instance.__dict__.get(name)) for name in AUTHOR_FIELDS[type(instance)])
+
+
+@receiver(post_init, sender=User)
+@receiver(post_init, sender=Profile)
+def _author_loaded(sender, instance, **kwargs):
+    instance._fragment_author_state = _author_state(instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Profile)
+def _author_saved(sender, instance, created, raw=False, **kwargs):
+    # Users and profiles are saved on every login; only bump when what comments show has changed
+    state = _author_state(instance)
+    if created or raw or state == getattr(instance, '_fragment_author_state', None):
+        return
+    instance._fragment_author_state = state
+    user_id = instance.pk if sender is User else instance.user_id
+    commented = Comment.objects.filter(author_id=user_id).values('plant_id')
+    Plant.objects.filter(pk__in=commented).update(fragment_version=F('fragment_version') + 1)
+    logger.debug(f"Bumped fragment versions of plants commented on by user {user_id}")
@@ -0,0 +1,194 @@
+import logging
+
+import cloudinary.uploader
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .counters import add_plants
+from .http_client import http_session
+from .models import ModerationJob, Plant, PlantDetail
+from .moderation import queue_for_moderation
+from .search import index_plants
+from .suggest import plant_suggestions
+
+logger = logging.getLogger(__name__)
+
+
+def plant_photo_options(plant):
+    """Cloudinary upload options for a plant's imported photo"""
+    return {'folder': 'plantbook/plants', 'public_id': f'plant_{plant.id}'}
+
+
+def detail_header(key):
+    """Header a PermaPeople data key is stored under, e.g. 'soil_type' -> 'Soil Type'"""
+    return key.replace('_', ' ').title()
+
+
+def permapeople_details(plant_details):
+    """Yield (header, information) for the non-empty key/value items of a PermaPeople record"""
+    for item in plant_details.get('data') or []:
+        if not isinstance(item, dict):
+            logger.warning(f"Invalid detail format: {item}")
+            continue
+        value = item.get('value', '')
+        if not value:
+            continue
+        yield detail_header(item.get('key', '')), value
+
+
+def _new_plant(owner, plant_details, **fields):
+    return Plant(
+        owner=owner,
+        name=plant_details.get('name') or '',
+        scientific_name=plant_details.get('scientific_name') or '',
+        description=plant_details.get('description') or '',
+        plant_photo=None,
+        **fields,
+    )
+
+
+def _plant_details(plant, plant_details):
+    """Unsaved PlantDetail rows for a record: its description, then its data items"""
+    details = []
+    if plant.description:
+        details.append(PlantDetail(plant=plant, header='Description', information=plant.description))
+    details.extend(
+        PlantDetail(plant=plant, header=header, information=information)
+        for header, information in permapeople_details(plant_details)
+    )
+    return details
+
+
+def create_plant_from_permapeople(owner, plant_details):
+    """Create a plant and all its details from a PermaPeople record.
+
+    The plant and details are written in one transaction with a single
+    bulk insert for the details. The image is queued for the moderation
+    worker, which downloads, checks and uploads it, so the caller gets the
+    plant back without waiting for the transfer.
+
+    Returns the plant and the number of details added from the record's data.
+    """
+    image_url = plant_details.get('image_url', '')
+
+    with transaction.atomic():
+        plant = _new_plant(owner, plant_details)
+        plant.save()
+
+        details = _plant_details(plant, plant_details)
+        PlantDetail.objects.bulk_create(details)
+        # bulk_create sends no signals, so the details are indexed here
+        index_plants([plant.pk])
+
+        if image_url and settings.MODERATION_ASYNC:
+            queue_for_moderation(plant, 'plant_photo', upload_options=plant_photo_options(plant), source_url=image_url)
+
+    if image_url and not settings.MODERATION_ASYNC:
+        # No worker runs in this mode, so the transfer happens in the request
+        transfer_plant_photo(plant, image_url)
+
+    details_added = len(details) - (1 if plant.description else 0)
+    logger.info(f"Created plant ID={plant.id} with {details_added} details from PermaPeople")
+    return plant, details_added
+
+
+def create_plants_from_permapeople(owner, records, is_public=False):
+    """Create many plants from PermaPeople records with a fixed number of queries.
+
+    One bulk insert each for the plants, all of their details and the
+    image transfer jobs, in a single transaction. Needs a database that
+    returns primary keys from bulk inserts (PostgreSQL, SQLite 3.35+).
+    Returns the plants in the order of ``records``.
+    """
+    if not records:
+        return []
+
+    with transaction.atomic():
+        plants = Plant.objects.bulk_create([_new_plant(owner, record, is_public=is_public) for record in records])
+        # bulk_create sends no signals, so the owner's count is kept here
+        add_plants(owner.pk, len(plants))
+
+        details = []
+        for plant, record in zip(plants, records):
+            details.extend(_plant_details(plant, record))
+        PlantDetail.objects.bulk_create(details, batch_size=500)
+        index_plants([plant.pk for plant in plants])
+        plant_suggestions.plants_changed(plants=plants)
+
+        images = [(plant, record.get('image_url')) for plant, record in zip(plants, records) if record.get('image_url')]
+        if images and settings.MODERATION_ASYNC:
+            content_type = ContentType.objects.get_for_model(Plant)
+            ModerationJob.objects.bulk_create([
+                ModerationJob(
+                    content_type=content_type,
+                    object_id=plant.pk,
+                    field_name='plant_photo',
+                    source_url=image_url,
+                    upload_options=plant_photo_options(plant),
+                )
+                for plant, image_url in images
+            ])
+
+    if not settings.MODERATION_ASYNC:
+        for plant, image_url in images:
+            transfer_plant_photo(plant, image_url)
+
+    logger.info(f"Created {len(plants)} plants with {len(details)} details from PermaPeople")
+    return plants
+
+
+def merge_permapeople_details(plant, plant_details):
+    """Upsert a PermaPeople record's details into an existing plant, matching on header.
+
+    Existing details are loaded in one query, then changed ones are written
+    with one bulk_update and new ones with one bulk_create, however many keys
+    the record has. When a header already appears more than once on the plant,
+    the oldest detail is updated, as before. Returns (updated, created) counts.
+    """
+    # Later items win when a record repeats a key
+    incoming = dict(permapeople_details(plant_details))
+
+    existing = {}
+    for detail in PlantDetail.objects.filter(plant=plant, header__in=incoming).order_by('id'):
+        existing.setdefault(detail.header, detail)
+
+    to_update = []
+    to_create = []
+    for header, information in incoming.items():
+        detail = existing.get(header)
+        if detail is None:
+            to_create.append(PlantDetail(plant=plant, header=header, information=information))
+        elif detail.information != information:
+            detail.information = information
+            to_update.append(detail)
+
+    with transaction.atomic():
+        if to_update:
+            PlantDetail.objects.bulk_update(to_update, ['information'])
+        if to_create:
+            PlantDetail.objects.bulk_create(to_create)
+        if to_update or to_create:
+            Plant.objects.filter(pk=plant.pk).update(updated_at=timezone.now(),
+                                                     fragment_version=F('fragment_version') + 1)
+            index_plants([plant.pk])
+
+    logger.info(f"Merged PermaPeople details into plant ID={plant.id}: "
+                f"{len(to_update)} updated, {len(to_create)} created")
+    return len(to_update), len(to_create)
+
+
+def transfer_plant_photo(plant, image_url):
+    """Download an image and upload it to Cloudinary as the plant's photo"""
+    try:
+        response = http_session.get(image_url)
+        if response.status_code != 200:
+            logger.warning(f"Failed to download image from URL: {image_url}")
+            return
+        plant.plant_photo = cloudinary.uploader.upload_image(response.content, **plant_photo_options(plant))
+        plant.save(update_fields=['plant_photo'])
+        logger.info(f"Successfully uploaded plant photo to Cloudinary: {plant.plant_photo}")
+    except Exception as e:
+        logger.error(f"Error uploading plant photo to Cloudinary: {str(e)}")
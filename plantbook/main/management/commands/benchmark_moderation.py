@@ -0,0 +1,162 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from main.moderation import decode_flags, decode_image, detect_batch, detector_pool
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def child_environment():
+    """Environment for a ``python -m django`` child that loads this process's settings
+    and finds the same modules, however this command was started"""
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+    env['PYTHONPATH'] = os.pathsep.join(os.path.abspath(path or os.curdir) for path in sys.path)
+    return env
+
+
+class Command(BaseCommand):
+    help = 'Measures moderation decode cost and throughput (images/sec) at different inference batch sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=64,
+                            help='Number of images scored per batch size')
+        parser.add_argument('--batch-sizes', default='1,8,32',
+                            help='Comma-separated batch sizes to compare')
+        parser.add_argument('--image-dir',
+                            help='Directory of sample images (defaults to synthetic JPEGs)')
+        parser.add_argument('--size', default='4032x3024',
+                            help='WIDTHxHEIGHT of synthetic images (default: a 12MP phone photo)')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Runs per batch size; the best run is reported')
+        parser.add_argument('--only', choices=['decode', 'batch'],
+                            help='Run only the decode or the batch benchmark')
+        # Internal: each decode mode is measured in a process of its own,
+        # since peak RSS only ever goes up
+        parser.add_argument('--decode-mode', choices=['full', 'reduced'], help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['decode_mode']:
+            self._measure_decode(options)
+            return
+
+        samples = self._load_samples(options)
+        if options['only'] != 'batch':
+            self._benchmark_decode(samples)
+        if options['only'] != 'decode':
+            detector_pool.warm_up(1)
+            self._benchmark_batches(samples, options)
+
+    def _benchmark_decode(self, samples):
+        """Compare full-size decoding with decoding straight to a reduced size.
+
+        Peak RSS includes onnxruntime's native buffers and OpenCV's pixel
+        data, which tracemalloc cannot see. Each mode runs in a fresh
+        process; "before" is its peak once the model is loaded and has
+        scored one image, "peak" its peak after every sample.
+        """
+        self.stdout.write(f"Decode + detect per upload, {len(samples)} images")
+        self.stdout.write(f"{'decode':>8}  {'decoded size':>12}  {'decode ms':>9}  {'total ms':>8}  "
+                          f"{'RSS before MB':>13}  {'peak RSS MB':>11}")
+        with tempfile.TemporaryDirectory() as image_dir:
+            for i, data in enumerate(samples):
+                with open(os.path.join(image_dir, f'{i:04d}.jpg'), 'wb') as f:
+                    f.write(data)
+            for mode in ('full', 'reduced'):
+                output = subprocess.run(
+                    [sys.executable, '-m', 'django', 'benchmark_moderation', '--decode-mode', mode,
+                     '--image-dir', image_dir, '--images', str(len(samples))],
+                    capture_output=True, text=True, check=True, env=child_environment(),
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                self.stdout.write(
+                    f"{mode:>8}  {result['shape']:>12}  {result['decode_ms']:>9.1f}  {result['total_ms']:>8.1f}  "
+                    f"{result['rss_before']:>13.1f}  {result['rss_peak']:>11.1f}"
+                )
+
+    def _measure_decode(self, options):
+        samples = self._load_samples(options)
+        reduced = options['decode_mode'] == 'reduced'
+        detector_pool.warm_up(1)
+        detect_batch([np.zeros((320, 320, 3), np.uint8)])
+        rss_before = peak_rss_mb()
+
+        decode_time = total_time = 0.0
+        for data in samples:
+            flags = decode_flags(data) if reduced else cv2.IMREAD_COLOR
+            start = time.perf_counter()
+            image = decode_image(data, flags)
+            decoded = time.perf_counter()
+            detect_batch([image])
+            finished = time.perf_counter()
+            decode_time += decoded - start
+            total_time += finished - start
+            height, width = image.shape[:2]
+            del image
+
+        self.stdout.write(json.dumps({
+            'shape': f"{width}x{height}",
+            'decode_ms': decode_time * 1000 / len(samples),
+            'total_ms': total_time * 1000 / len(samples),
+            'rss_before': rss_before,
+            'rss_peak': peak_rss_mb(),
+        }))
+
+    def _benchmark_batches(self, samples, options):
+        """Compare images/sec across inference batch sizes."""
+        batch_sizes = [int(size) for size in options['batch_sizes'].split(',')]
+        images = [decode_image(data) for data in samples]
+        detect_batch(images[:1])
+
+        self.stdout.write(f"Scoring {len(images)} images on CPU, best of {options['repeat']} runs")
+        self.stdout.write(f"{'batch size':>10}  {'seconds':>8}  {'images/sec':>10}")
+        for batch_size in batch_sizes:
+            best = None
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                for i in range(0, len(images), batch_size):
+                    detect_batch(images[i:i + batch_size])
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            self.stdout.write(f"{batch_size:>10}  {best:>8.2f}  {len(images) / best:>10.1f}")
+
+    def _load_samples(self, options):
+        count = options['images']
+        if options['image_dir']:
+            paths = sorted(
+                os.path.join(options['image_dir'], name)
+                for name in os.listdir(options['image_dir'])
+                if name.lower().endswith(('.jpg', '.jpeg', '.png', '.webp'))
+            )
+            if not paths:
+                raise CommandError(f"No images found in {options['image_dir']}")
+            samples = []
+            for i in range(count):
+                with open(paths[i % len(paths)], 'rb') as f:
+                    samples.append(f.read())
+            return samples
+
+        width, height = (int(value) for value in options['size'].lower().split('x'))
+        rng = np.random.default_rng(0)
+        samples = []
+        for _ in range(count):
+            # Smooth random colour fields compress like photos rather than noise
+            small = rng.integers(0, 255, (height // 32, width // 32, 3), dtype=np.uint8)
+            image = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+            ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+            samples.append(encoded.tobytes())
+        return samples
@@ -0,0 +1,179 @@
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from main.ingestion import create_plants_from_permapeople
+from main.utils import permapeople_api
+
+
+class RateLimiter:
+    """Spaces out calls from any number of threads to at most ``rate`` per second."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        time.sleep(start - now)
+
+
+class Command(BaseCommand):
+    help = 'Imports plants from a file of PermaPeople IDs or search queries, one per line'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source',
+                            help="File with one PermaPeople ID or search query per line ('-' for stdin)")
+        parser.add_argument('--owner', required=True,
+                            help='Username the imported plants belong to')
+        parser.add_argument('--queries', action='store_true',
+                            help='Treat every line as a search query (by default numeric lines are IDs)')
+        parser.add_argument('--per-query', type=int, default=1,
+                            help='Number of top search hits imported for each query')
+        parser.add_argument('--public', action='store_true',
+                            help='Make the imported plants public')
+        parser.add_argument('--workers', type=int, default=settings.PERMAPEOPLE_MAX_WORKERS,
+                            help='Concurrent PermaPeople requests')
+        parser.add_argument('--rate', type=float, default=5.0,
+                            help='Maximum PermaPeople requests per second (0 for no limit)')
+        parser.add_argument('--chunk-size', type=int, default=50,
+                            help='Lines fetched and written per bulk insert')
+        parser.add_argument('--checkpoint',
+                            help='Progress file used to resume an interrupted import '
+                                 '(defaults to SOURCE.checkpoint)')
+
+    def handle(self, *args, **options):
+        try:
+            owner = User.objects.get(username=options['owner'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['owner']}")
+
+        entries = self._read_entries(options['source'])
+        checkpoint_path = options['checkpoint']
+        if not checkpoint_path and options['source'] != '-':
+            checkpoint_path = f"{options['source']}.checkpoint"
+        checkpoint = self._load_checkpoint(checkpoint_path)
+        done = set(checkpoint['done'])
+        imported = set(checkpoint['imported'])
+
+        pending = [entry for entry in entries if entry not in done]
+        if len(pending) < len(entries):
+            self.stdout.write(f"Resuming from {checkpoint_path}: {len(entries) - len(pending)} of "
+                              f"{len(entries)} lines already done")
+
+        self.limiter = RateLimiter(options['rate'])
+        self.options = options
+        plants_created = failed = 0
+        start = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=options['workers'], thread_name_prefix='import') as executor:
+            for i in range(0, len(pending), options['chunk_size']):
+                chunk = pending[i:i + options['chunk_size']]
+
+                # Resolve queries to IDs, then fetch each new record once
+                resolved = dict(zip(chunk, executor.map(self._resolve, chunk)))
+                plant_ids = []
+                for ids in resolved.values():
+                    if ids is None:
+                        failed += 1
+                        continue
+                    plant_ids.extend(plant_id for plant_id in ids
+                                     if plant_id not in imported and plant_id not in plant_ids)
+
+                records = []
+                fetched_ids = []
+                missing_ids = set()
+                for plant_id, record in zip(plant_ids, executor.map(self._fetch, plant_ids)):
+                    if record and record.get('name'):
+                        records.append(record)
+                        fetched_ids.append(plant_id)
+                    else:
+                        self.stderr.write(f"Could not fetch PermaPeople plant {plant_id}")
+                        missing_ids.add(plant_id)
+                        failed += 1
+
+                plants_created += len(create_plants_from_permapeople(owner, records, is_public=options['public']))
+
+                # Lines that failed stay pending so a rerun retries them
+                imported.update(fetched_ids)
+                done.update(entry for entry, ids in resolved.items()
+                            if ids is not None and not missing_ids.intersection(ids))
+                self._save_checkpoint(checkpoint_path, done, imported)
+
+                elapsed = time.monotonic() - start
+                self.stdout.write(
+                    f"{len(entries) - len(pending) + i + len(chunk)}/{len(entries)} lines, "
+                    f"{plants_created} plants imported, {failed} failed, "
+                    f"{plants_created / elapsed if elapsed else 0:.1f} plants/sec"
+                )
+
+        elapsed = time.monotonic() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {plants_created} plants in {elapsed:.1f}s "
+            f"({plants_created / elapsed if elapsed else 0:.1f} plants/sec), {failed} failed"
+        ))
+
+    def _read_entries(self, source):
+        if source == '-':
+            lines = sys.stdin.read().splitlines()
+        else:
+            try:
+                with open(source) as f:
+                    lines = f.read().splitlines()
+            except OSError as e:
+                raise CommandError(f"Cannot read {source}: {e}")
+
+        entries = []
+        for line in lines:
+            line = ' '.join(line.split())
+            if line and not line.startswith('#') and line not in entries:
+                entries.append(line)
+        return entries
+
+    def _resolve(self, entry):
+        """PermaPeople IDs for a line, or None if its search failed"""
+        if entry.isdigit() and not self.options['queries']:
+            return [entry]
+        self.limiter.wait()
+        try:
+            plant_ids, _ = permapeople_api.search_hits(entry)
+        except Exception as e:
+            self.stderr.write(f"Search for {entry!r} failed: {e}")
+            return None
+        if not plant_ids:
+            self.stderr.write(f"No PermaPeople plants found for {entry!r}")
+        return [str(plant_id) for plant_id in plant_ids[:self.options['per_query']]]
+
+    def _fetch(self, plant_id):
+        self.limiter.wait()
+        return permapeople_api.get_plant(plant_id)
+
+    def _load_checkpoint(self, path):
+        if not path or not os.path.exists(path):
+            return {'done': [], 'imported': []}
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read checkpoint {path}: {e}")
+
+    def _save_checkpoint(self, path, done, imported):
+        if not path:
+            return
+        # Write then rename, so an interrupted write never corrupts the checkpoint
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'done': sorted(done), 'imported': sorted(imported)}, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,143 @@
+import logging
+import signal
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from main.moderation import (
+    ModerationError,
+    apply_verdict,
+    check_batch,
+    claim_jobs,
+    detector_pool,
+    fail_job,
+    fetch_source,
+    quarantine,
+    requeue_stale_jobs,
+)
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Runs NSFW detection for queued uploads, then publishes or quarantines them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=detector_pool.size,
+                            help='Number of worker threads (defaults to the detector pool size)')
+        parser.add_argument('--batch-size', type=int, default=settings.MODERATION_BATCH_SIZE,
+                            help='Maximum number of images scored in one inference call')
+        parser.add_argument('--batch-timeout', type=float, default=settings.MODERATION_BATCH_TIMEOUT,
+                            help='Seconds to wait for a partial batch to fill up')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--max-attempts', type=int, default=3,
+                            help='Attempts before a failing job is quarantined')
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help='Seconds after which a job stuck in processing is requeued')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the queue and exit instead of running as a daemon')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.stopping = threading.Event()
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        detector_pool.warm_up(min(options['threads'], detector_pool.size))
+        requeue_stale_jobs(timedelta(seconds=options['stale_after']))
+
+        self.stdout.write(self.style.SUCCESS(f"Moderation worker started with {options['threads']} threads"))
+        threads = [
+            threading.Thread(target=self._run, name=f'moderation-{i}', daemon=True)
+            for i in range(options['threads'])
+        ]
+        for thread in threads:
+            thread.start()
+
+        last_stale_check = time.monotonic()
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=1)
+            if not options['once'] and time.monotonic() - last_stale_check > options['stale_after']:
+                close_old_connections()
+                requeue_stale_jobs(timedelta(seconds=options['stale_after']))
+                last_stale_check = time.monotonic()
+
+        self.stdout.write(self.style.SUCCESS('Moderation worker stopped'))
+
+    def _stop(self, signum, frame):
+        logger.info(f"Received signal {signum}, finishing current jobs")
+        self.stopping.set()
+
+    def _collect_batch(self):
+        """Claim jobs until the batch is full or the batch timeout expires."""
+        batch_size = self.options['batch_size']
+        batch = claim_jobs(limit=batch_size)
+        if not batch:
+            return batch
+
+        deadline = time.monotonic() + self.options['batch_timeout']
+        while len(batch) < batch_size and not self.stopping.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self.stopping.wait(min(remaining, 0.1))
+            batch += claim_jobs(limit=batch_size - len(batch))
+        return batch
+
+    def _load_sources(self, jobs):
+        """Download the images of jobs queued with a source URL, dropping the ones that fail."""
+        ready = []
+        for job in jobs:
+            if job.source_url and not job.image_data:
+                try:
+                    fetch_source(job)
+                except ModerationError as e:
+                    quarantine(job, job.target, str(e))
+                    continue
+                except Exception as e:
+                    logger.error(f"Error downloading image for moderation job {job.id}: {str(e)}")
+                    fail_job(job, str(e), self.options['max_attempts'])
+                    continue
+            ready.append(job)
+        return ready
+
+    def _run(self):
+        try:
+            while not self.stopping.is_set():
+                close_old_connections()
+                jobs = self._collect_batch()
+                if not jobs:
+                    if self.options['once']:
+                        break
+                    self.stopping.wait(self.options['poll_interval'])
+                    continue
+
+                jobs = self._load_sources(jobs)
+                if not jobs:
+                    continue
+
+                start = time.monotonic()
+                try:
+                    verdicts = check_batch([bytes(job.image_data) for job in jobs])
+                except Exception as e:
+                    logger.error(f"Error scoring batch of {len(jobs)} moderation jobs: {str(e)}", exc_info=True)
+                    for job in jobs:
+                        fail_job(job, str(e), self.options['max_attempts'])
+                    continue
+
+                for job, verdict in zip(jobs, verdicts):
+                    try:
+                        apply_verdict(job, verdict)
+                    except Exception as e:
+                        logger.error(f"Error processing moderation job {job.id}: {str(e)}", exc_info=True)
+                        fail_job(job, str(e), self.options['max_attempts'])
+
+                elapsed = time.monotonic() - start
+                logger.info(f"Processed batch of {len(jobs)} moderation jobs in {elapsed:.3f}s "
+                            f"({len(jobs) / elapsed:.1f} images/sec)")
+        finally:
+            connection.close()
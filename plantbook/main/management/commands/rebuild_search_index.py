@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+from main.models import Plant
+from main.search import index_plants
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index for all plants'
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        index_plants()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {Plant.objects.count()} plants in {time.monotonic() - start:.1f}s"
+        ))
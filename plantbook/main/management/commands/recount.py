@@ -0,0 +1,14 @@
+import time
+
+from django.core.management.base import BaseCommand
+from main.counters import recount
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the plant, like and comment counters and fixes any that have drifted'
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        fixed = recount()
+        summary = ', '.join(f"{count} {name.lower()} rows" for name, count in fixed.items())
+        self.stdout.write(self.style.SUCCESS(f"Fixed {summary} in {time.monotonic() - start:.1f}s"))
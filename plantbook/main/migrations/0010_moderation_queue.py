@@ -0,0 +1,62 @@
+# Generated by Django 5.1.7 on 2026-10-18 14:59
+
+import cloudinary.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('main', '0009_observation_updated_at_alter_observation_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='observation',
+            name='moderation_status',
+            field=models.CharField(choices=[('pending', 'Pending moderation'), ('approved', 'Approved'), ('quarantined', 'Quarantined')], default='approved', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='plantphoto',
+            name='moderation_status',
+            field=models.CharField(choices=[('pending', 'Pending moderation'), ('approved', 'Approved'), ('quarantined', 'Quarantined')], default='approved', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='moderation_status',
+            field=models.CharField(choices=[('pending', 'Pending moderation'), ('approved', 'Approved'), ('quarantined', 'Quarantined')], default='approved', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='observation',
+            name='image',
+            field=cloudinary.models.CloudinaryField(blank=True, max_length=255, null=True, verbose_name='image'),
+        ),
+        migrations.AlterField(
+            model_name='plantphoto',
+            name='image',
+            field=cloudinary.models.CloudinaryField(blank=True, max_length=255, null=True, verbose_name='image'),
+        ),
+        migrations.CreateModel(
+            name='ModerationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('field_name', models.CharField(max_length=50)),
+                ('image_data', models.BinaryField()),
+                ('upload_options', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('processing', 'Processing'), ('quarantined', 'Quarantined'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='main_modera_status_9c51ef_idx')],
+            },
+        ),
+    ]
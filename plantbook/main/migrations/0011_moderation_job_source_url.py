@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_moderation_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='moderationjob',
+            name='source_url',
+            field=models.URLField(blank=True, max_length=1000),
+        ),
+        migrations.AlterField(
+            model_name='moderationjob',
+            name='image_data',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+    ]
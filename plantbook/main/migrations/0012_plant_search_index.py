@@ -0,0 +1,58 @@
+from django.db import migrations
+
+# The SQL is kept here as it stood when the index was created rather than
+# imported from main.search, so migrating from scratch does not depend on
+# the current state of that module.
+
+POSTGRES_DOCUMENT = """
+    setweight(to_tsvector('english', coalesce(p.name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(p.scientific_name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(p.description, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce((
+        SELECT string_agg(d.header || ' ' || d.information, ' ')
+        FROM main_plantdetail d WHERE d.plant_id = p.id
+    ), '')), 'C')
+"""
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('ALTER TABLE main_plant ADD COLUMN IF NOT EXISTS search_vector tsvector')
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS main_plant_search_vector_gin ON main_plant USING gin (search_vector)'
+        )
+        schema_editor.execute(f'UPDATE main_plant p SET search_vector = {POSTGRES_DOCUMENT}')
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS main_plant_fts "
+            "USING fts5(name, scientific_name, description, details, tokenize='porter unicode61')"
+        )
+        schema_editor.execute(
+            """INSERT INTO main_plant_fts (rowid, name, scientific_name, description, details)
+            SELECT p.id, p.name, p.scientific_name, p.description,
+                   (SELECT group_concat(d.header || ' ' || d.information, ' ')
+                    FROM main_plantdetail d WHERE d.plant_id = p.id)
+            FROM main_plant p"""
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS main_plant_search_vector_gin')
+        schema_editor.execute('ALTER TABLE main_plant DROP COLUMN IF EXISTS search_vector')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS main_plant_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_moderation_job_source_url'),
+    ]
+
+    operations = [
+        # A tsvector column and GIN index on PostgreSQL, an FTS5 table on SQLite
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:25
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _count(queryset, field, outer='pk'):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef(outer)}).order_by().values(field).annotate(n=Count('*')).values('n')
+        ),
+        Value(0),
+    )
+
+
+def fill_counters(apps, schema_editor):
+    Plant = apps.get_model('main', 'Plant')
+    Profile = apps.get_model('main', 'Profile')
+    Comment = apps.get_model('main', 'Comment')
+    Profile.objects.update(plant_count=_count(Plant.objects.all(), 'owner', outer='user'))
+    Plant.objects.update(
+        like_count=_count(Plant.likes.through.objects.all(), 'plant'),
+        comment_count=_count(Comment.objects.all(), 'plant'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_plant_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plant',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='plant',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='plant_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['-plant_count', 'user'], name='main_profile_plant_count_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
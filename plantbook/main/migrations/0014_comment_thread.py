@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+
+
+def fill_threads(apps, schema_editor):
+    Comment = apps.get_model('main', 'Comment')
+    Comment.objects.filter(parent__isnull=False, parent__parent__isnull=True).update(thread=F('parent'))
+    # Then a level of nesting at a time, taking the parent's thread
+    parent_thread = Subquery(Comment.objects.filter(pk=OuterRef('parent')).values('thread')[:1])
+    while Comment.objects.filter(thread__isnull=True, parent__thread__isnull=False).update(thread=parent_thread):
+        pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='thread',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='thread_comments', to='main.comment'),
+        ),
+        migrations.RunPython(fill_threads, migrations.RunPython.noop),
+    ]
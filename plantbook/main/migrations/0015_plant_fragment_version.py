@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_comment_thread'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plant',
+            name='fragment_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
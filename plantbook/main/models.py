@@ -1,5 +1,8 @@
 from django.db import models
+from django.db.models import F
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.core.files.storage import default_storage
@@ -8,15 +11,33 @@ from cloudinary.models import CloudinaryField
 
 logger = logging.getLogger(__name__)
 
+MODERATION_PENDING = 'pending'
+MODERATION_APPROVED = 'approved'
+MODERATION_QUARANTINED = 'quarantined'
+MODERATION_STATUS_CHOICES = [
+    (MODERATION_PENDING, 'Pending moderation'),
+    (MODERATION_APPROVED, 'Approved'),
+    (MODERATION_QUARANTINED, 'Quarantined'),
+]
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     bio = models.TextField(max_length=500, blank=True)
     profile_photo = CloudinaryField('image', null=True, blank=True)
+    moderation_status = models.CharField(max_length=20, choices=MODERATION_STATUS_CHOICES, default=MODERATION_APPROVED)
     location = models.CharField(max_length=100, blank=True)
+    # Maintained by the signals in main.counters; repair with manage.py recount
+    plant_count = models.PositiveIntegerField(default=0)
     joined_date = models.DateTimeField(auto_now_add=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # The directory lists users with the most plants first
+            models.Index(fields=['-plant_count', 'user'], name='main_profile_plant_count_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username}'s profile"
 
@@ -56,6 +77,11 @@ class Plant(models.Model):
     is_public = models.BooleanField(default=False)
     likes = models.ManyToManyField(User, related_name='liked_plants', blank=True)
     comments = models.ManyToManyField('Comment', related_name='plants', blank=True)
+    # Maintained by the signals in main.counters; repair with manage.py recount
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    # Cached fragments of the plant's page are keyed on this; see main.fragments
+    fragment_version = models.PositiveBigIntegerField(default=0)
 
     def __str__(self):
         return f"{self.name} ({self.scientific_name})"
@@ -67,7 +93,15 @@ class Plant(models.Model):
         return None
 
     def save(self, *args, **kwargs):
+        bump = not self._state.adding
+        if bump:
+            # Incremented in the UPDATE itself, so a stale copy never writes back an old version
+            self.fragment_version = F('fragment_version') + 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = [*kwargs['update_fields'], 'fragment_version']
         super().save(*args, **kwargs)
+        if bump:
+            self.refresh_from_db(fields=['fragment_version'])
         if self.plant_photo:
             print(f"Plant photo URL: {self.plant_photo.url}")
 
@@ -85,6 +119,7 @@ class Observation(models.Model):
     plant = models.ForeignKey(Plant, on_delete=models.CASCADE, related_name='observations')
     note = models.TextField()
     image = CloudinaryField('image', null=True, blank=True)  # Use CloudinaryField instead of URLField
+    moderation_status = models.CharField(max_length=20, choices=MODERATION_STATUS_CHOICES, default=MODERATION_APPROVED)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -103,6 +138,7 @@ class Observation(models.Model):
 class PlantPhoto(models.Model):
     plant = models.ForeignKey(Plant, related_name='photos', on_delete=models.CASCADE)
     image = CloudinaryField('image', null=True, blank=True)  # Use CloudinaryField instead of ImageField
+    moderation_status = models.CharField(max_length=20, choices=MODERATION_STATUS_CHOICES, default=MODERATION_APPROVED)
     caption = models.CharField(max_length=200, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -124,6 +160,8 @@ class Comment(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     plant = models.ForeignKey(Plant, on_delete=models.CASCADE, related_name='plant_comments')
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
+    # The top-level comment a reply is under, at any depth, so a thread loads in one query
+    thread = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='thread_comments')
 
     class Meta:
         ordering = ['-created_at']
@@ -131,6 +169,11 @@ class Comment(models.Model):
     def __str__(self):
         return f"Comment by {self.author.username} on {self.plant.name}"
 
+    def save(self, *args, **kwargs):
+        if self.parent_id is not None and self.thread_id is None:
+            self.thread_id = self.parent.thread_id or self.parent_id
+        super().save(*args, **kwargs)
+
     def get_replies(self):
         return self.replies.all().order_by('created_at')
 
@@ -146,3 +189,43 @@ class Message(models.Model):
 
     def __str__(self):
         return f'Message from {self.sender} to {self.recipient}'
+
+class ModerationJob(models.Model):
+    """An image waiting for NSFW detection before it is published.
+
+    Uploads carry their bytes in ``image_data``; images imported from another
+    site carry a ``source_url`` that the worker downloads first.
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_PROCESSING = 'processing'
+    STATUS_QUARANTINED = 'quarantined'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_PROCESSING, 'Processing'),
+        (STATUS_QUARANTINED, 'Quarantined'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveBigIntegerField()
+    target = GenericForeignKey('content_type', 'object_id')
+    field_name = models.CharField(max_length=50)
+    image_data = models.BinaryField(blank=True, default=b'')
+    source_url = models.URLField(max_length=1000, blank=True)
+    upload_options = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Moderation job {self.id} for {self.content_type.model} {self.object_id} ({self.status})"
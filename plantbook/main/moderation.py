@@ -0,0 +1,489 @@
+import hashlib
+import io
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+import cloudinary.uploader
+import cv2
+import nudenet
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import F
+from django.utils import timezone
+from nudenet import NudeDetector
+from PIL import Image
+
+from .http_client import http_session
+from .models import (
+    ModerationJob,
+    MODERATION_APPROVED,
+    MODERATION_PENDING,
+    MODERATION_QUARANTINED,
+)
+
+logger = logging.getLogger(__name__)
+
+# Detections scoring above this threshold in one of the classes below
+# cause an image to be rejected
+NSFW_THRESHOLD = 0.2
+NSFW_CLASSES = [
+    'NSFW',
+    'EXPOSED_BREAST_F',
+    'EXPOSED_GENITALIA_F',
+    'EXPOSED_GENITALIA_M',
+    'EXPOSED_ANUS',
+    'EXPOSED_BUTTOCKS',
+    'EXPOSED_FEET',
+    'EXPOSED_BREAST_M',
+    'FEMALE_GENITALIA_EXPOSED',
+    'MALE_GENITALIA_EXPOSED',
+    'FEMALE_BREAST_EXPOSED',
+    'MALE_BREAST_EXPOSED',
+    'BELLY_EXPOSED',
+]
+
+
+NSFW_MODEL_PATH = os.path.join(os.path.dirname(nudenet.__file__), '320n.onnx')
+
+# The detector works on 320px inputs, so large images are decoded at a
+# reduced scale as long as their longest side stays at least this big
+DECODE_MIN_SIZE = 640
+REDUCED_DECODE_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+]
+
+# Largest image the worker will download for a job queued with a source URL
+MAX_SOURCE_BYTES = 20 * 1024 * 1024
+
+
+class ModerationError(Exception):
+    """Raised when an image cannot be decoded or checked."""
+
+
+class DetectorPoolTimeout(Exception):
+    """Raised when no detector becomes available within the timeout."""
+
+
+class DetectorPool:
+    """Fixed-size pool of NudeDetector instances shared across threads.
+
+    Detectors are created lazily, up to ``size``, the first time they are
+    needed. Loading the ONNX model is the expensive part, so each worker
+    process pays for it at most ``size`` times instead of once per upload.
+    """
+
+    def __init__(self, size=1, timeout=None):
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self._available = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+        # Wait-time statistics
+        self._acquisitions = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def _create_detector(self):
+        start = time.monotonic()
+        detector = NudeDetector()
+        logger.info(f"Loaded NudeDetector model in {time.monotonic() - start:.3f}s")
+        return detector
+
+    def _checkout(self, timeout):
+        try:
+            return self._available.get_nowait()
+        except queue.Empty:
+            pass
+
+        # Nothing idle: create a new detector if the pool is not full yet
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+
+        if can_create:
+            try:
+                return self._create_detector()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._available.get(timeout=timeout)
+        except queue.Empty:
+            raise DetectorPoolTimeout(f"No detector available after waiting {timeout}s")
+
+    def _record_wait(self, waited):
+        with self._lock:
+            self._acquisitions += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+
+    @contextmanager
+    def acquire(self, timeout=None):
+        """Borrow a detector from the pool for the duration of the block."""
+        if timeout is None:
+            timeout = self.timeout
+
+        start = time.monotonic()
+        detector = self._checkout(timeout)
+        waited = time.monotonic() - start
+        self._record_wait(waited)
+        logger.debug(f"Acquired detector after waiting {waited:.3f}s")
+
+        try:
+            yield detector
+        finally:
+            self._available.put(detector)
+
+    def warm_up(self, count=None):
+        """Load up to ``count`` detectors (default: the full pool) ahead of time."""
+        if count is None:
+            count = self.size
+
+        loaded = 0
+        while loaded < count:
+            with self._lock:
+                if self._created >= self.size:
+                    break
+                self._created += 1
+            try:
+                self._available.put(self._create_detector())
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+            loaded += 1
+
+        logger.info(f"Warmed up {loaded} detectors ({self._created}/{self.size} loaded)")
+        return loaded
+
+    def stats(self):
+        """Return pool size and wait-time statistics."""
+        with self._lock:
+            return {
+                'size': self.size,
+                'loaded': self._created,
+                'idle': self._available.qsize(),
+                'acquisitions': self._acquisitions,
+                'total_wait': self._total_wait,
+                'avg_wait': self._total_wait / self._acquisitions if self._acquisitions else 0.0,
+                'max_wait': self._max_wait,
+            }
+
+
+# Process-wide pool shared by all image-moderating forms
+detector_pool = DetectorPool(
+    size=settings.MODERATION_DETECTOR_POOL_SIZE,
+    timeout=settings.MODERATION_DETECTOR_TIMEOUT,
+)
+
+
+def read_upload(uploaded_file):
+    """Read the raw bytes of an uploaded file and rewind it for the storage backend."""
+    data = b''.join(uploaded_file.chunks())
+    uploaded_file.seek(0)
+    return data
+
+
+def decode_flags(data):
+    """Pick the cv2.imdecode flags that shrink the image while it is decoded."""
+    try:
+        # Only parses the header, the pixels are not decoded
+        width, height = Image.open(io.BytesIO(data)).size
+    except Exception:
+        return cv2.IMREAD_COLOR
+
+    longest = max(width, height)
+    for factor, flags in REDUCED_DECODE_FLAGS:
+        if longest // factor >= DECODE_MIN_SIZE:
+            return flags
+    return cv2.IMREAD_COLOR
+
+
+def decode_image(data, flags=None):
+    """Decode image bytes into a BGR array in memory, downscaling large images.
+
+    JPEGs are scaled down inside the decoder, so a 12MP phone photo never
+    exists at full resolution in memory. Formats OpenCV cannot read, such as
+    GIF, are decoded with PIL instead.
+    """
+    if flags is None:
+        flags = decode_flags(data)
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), flags)
+    if image is None:
+        image = decode_image_with_pil(data)
+    return image
+
+
+def decode_image_with_pil(data):
+    """Decode the first frame of an image OpenCV cannot read, downscaled like decode_flags()."""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            longest = max(image.size)
+            factor = next((factor for factor, _ in REDUCED_DECODE_FLAGS if longest // factor >= DECODE_MIN_SIZE), 1)
+            rgb = image.convert('RGB')
+    except Exception as e:
+        raise ModerationError("Invalid image format") from e
+    if factor > 1:
+        rgb = rgb.reduce(factor)
+    return cv2.cvtColor(np.asarray(rgb), cv2.COLOR_RGB2BGR)
+
+
+def find_nsfw(detections):
+    """Return the first detection that counts as NSFW content, or None."""
+    for detection in detections:
+        logger.info(f"Detected: {detection['class']} with confidence: {detection['score']}")
+        if detection['score'] > NSFW_THRESHOLD and detection['class'] in NSFW_CLASSES:
+            return detection
+    return None
+
+
+def content_hash(data):
+    """Return the SHA-256 hex digest used to key cached verdicts."""
+    return hashlib.sha256(data).hexdigest()
+
+
+@lru_cache(maxsize=1)
+def verdict_cache_version():
+    """Fingerprint of the model and rules; changing either invalidates cached verdicts."""
+    digest = hashlib.sha256()
+    with open(NSFW_MODEL_PATH, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    digest.update(f"{NSFW_THRESHOLD}:{','.join(sorted(NSFW_CLASSES))}".encode())
+    return digest.hexdigest()[:16]
+
+
+def get_cached_verdicts(hashes):
+    """Look up cached NSFW verdicts, returning {hash: bool} for the hits."""
+    keys = {f"verdict:{h}": h for h in hashes}
+    try:
+        found = caches['moderation'].get_many(keys.keys(), version=verdict_cache_version())
+    except Exception as e:
+        logger.error(f"Error reading moderation verdict cache: {str(e)}")
+        return {}
+    return {keys[key]: verdict for key, verdict in found.items()}
+
+
+def cache_verdicts(verdicts):
+    """Store {hash: bool} NSFW verdicts."""
+    if not verdicts:
+        return
+    try:
+        caches['moderation'].set_many(
+            {f"verdict:{h}": verdict for h, verdict in verdicts.items()},
+            version=verdict_cache_version(),
+        )
+    except Exception as e:
+        logger.error(f"Error writing moderation verdict cache: {str(e)}")
+
+
+def is_nsfw(data):
+    """Check raw image bytes for NSFW content without writing them anywhere."""
+    result = check_batch([data])[0]
+    if isinstance(result, ModerationError):
+        raise result
+    return result
+
+
+def detect_batch(images):
+    """Run one batched ONNX inference over decoded images, returning their detections."""
+    if not images:
+        return []
+    with detector_pool.acquire() as detector:
+        return detector.detect_batch(images, batch_size=len(images))
+
+
+def check_batch(data_list):
+    """Check several images, running inference only for content not seen before.
+
+    Returns one entry per input: True/False for NSFW, or a ModerationError
+    for images that could not be decoded.
+    """
+    hashes = [content_hash(data) for data in data_list]
+    verdicts = get_cached_verdicts(set(hashes))
+    if verdicts:
+        logger.info(f"Moderation verdict cache hits: {len(verdicts)}/{len(set(hashes))}")
+
+    # Decode each unseen image once, even if it appears several times in the batch
+    errors = {}
+    images = []
+    image_hashes = []
+    for data, digest in zip(data_list, hashes):
+        if digest in verdicts or digest in errors or digest in image_hashes:
+            continue
+        try:
+            images.append(decode_image(data))
+            image_hashes.append(digest)
+        except ModerationError as e:
+            errors[digest] = e
+
+    new_verdicts = {}
+    for digest, detections in zip(image_hashes, detect_batch(images)):
+        logger.info(f"NSFW detection results: {detections}")
+        detection = find_nsfw(detections)
+        if detection:
+            logger.warning(f"NSFW content detected: {detection['class']}")
+        new_verdicts[digest] = detection is not None
+    cache_verdicts(new_verdicts)
+    verdicts.update(new_verdicts)
+
+    return [verdicts.get(digest, errors.get(digest)) for digest in hashes]
+
+
+def _has_moderation_status(instance):
+    return any(field.name == 'moderation_status' for field in instance._meta.fields)
+
+
+def queue_for_moderation(instance, field_name, data=b'', upload_options=None, source_url=''):
+    """Queue image bytes, or an image URL to download, for ``instance.<field_name>``.
+
+    Instances with a ``moderation_status`` are marked pending until the job is done.
+    """
+    content_type = ContentType.objects.get_for_model(instance)
+
+    # A newer upload for the same field supersedes any that are still queued
+    ModerationJob.objects.filter(
+        content_type=content_type,
+        object_id=instance.pk,
+        field_name=field_name,
+        status=ModerationJob.STATUS_QUEUED,
+    ).delete()
+
+    job = ModerationJob.objects.create(
+        content_type=content_type,
+        object_id=instance.pk,
+        field_name=field_name,
+        image_data=data,
+        source_url=source_url,
+        upload_options=upload_options or {},
+    )
+    if _has_moderation_status(instance) and instance.moderation_status != MODERATION_PENDING:
+        instance.moderation_status = MODERATION_PENDING
+        instance.save(update_fields=['moderation_status'])
+
+    logger.info(f"Queued moderation job {job.id} for {content_type.model} {instance.pk}.{field_name}")
+    return job
+
+
+def claim_jobs(limit=1):
+    """Atomically claim up to ``limit`` queued jobs for this worker."""
+    candidates = ModerationJob.objects.filter(
+        status=ModerationJob.STATUS_QUEUED
+    ).order_by('created_at').values_list('id', flat=True)[:limit * 2]
+
+    claimed = []
+    for job_id in candidates:
+        # Conditional update so two workers can never claim the same job
+        updated = ModerationJob.objects.filter(
+            id=job_id, status=ModerationJob.STATUS_QUEUED
+        ).update(
+            status=ModerationJob.STATUS_PROCESSING,
+            locked_at=timezone.now(),
+            attempts=F('attempts') + 1,
+        )
+        if updated:
+            claimed.append(job_id)
+        if len(claimed) >= limit:
+            break
+
+    return list(ModerationJob.objects.filter(id__in=claimed).order_by('created_at'))
+
+
+def requeue_stale_jobs(older_than):
+    """Put jobs left in processing by a crashed worker back in the queue."""
+    cutoff = timezone.now() - older_than
+    count = ModerationJob.objects.filter(
+        status=ModerationJob.STATUS_PROCESSING, locked_at__lt=cutoff
+    ).update(status=ModerationJob.STATUS_QUEUED, locked_at=None)
+    if count:
+        logger.warning(f"Requeued {count} stale moderation jobs")
+    return count
+
+
+def fetch_source(job):
+    """Download the image of a job queued with a ``source_url`` and keep it on the job."""
+    response = http_session.get(job.source_url, stream=True)
+    try:
+        response.raise_for_status()
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(64 * 1024):
+            size += len(chunk)
+            if size > MAX_SOURCE_BYTES:
+                raise ModerationError(f"Image at {job.source_url} is larger than {MAX_SOURCE_BYTES} bytes")
+            chunks.append(chunk)
+    finally:
+        response.close()
+
+    job.image_data = b''.join(chunks)
+    job.save(update_fields=['image_data', 'updated_at'])
+    logger.info(f"Downloaded {size} bytes for moderation job {job.id} from {job.source_url}")
+
+
+def publish(job, target):
+    """Upload an approved image to Cloudinary and attach it to its target."""
+    image = cloudinary.uploader.upload_image(bytes(job.image_data), **job.upload_options)
+    setattr(target, job.field_name, image)
+    update_fields = [job.field_name]
+    if _has_moderation_status(target):
+        target.moderation_status = MODERATION_APPROVED
+        update_fields.append('moderation_status')
+    target.save(update_fields=update_fields)
+    logger.info(f"Published moderation job {job.id} to {target}")
+    job.delete()
+
+
+def quarantine(job, target, reason):
+    """Keep a rejected image out of Cloudinary, retaining it on the job for review."""
+    if target is not None and _has_moderation_status(target):
+        target.moderation_status = MODERATION_QUARANTINED
+        target.save(update_fields=['moderation_status'])
+    job.status = ModerationJob.STATUS_QUARANTINED
+    job.error = reason
+    job.save(update_fields=['status', 'error', 'updated_at'])
+    logger.warning(f"Quarantined moderation job {job.id}: {reason}")
+
+
+def fail_job(job, error, max_attempts):
+    """Retry a job that hit an unexpected error, quarantining it after ``max_attempts``."""
+    if job.attempts < max_attempts:
+        job.status = ModerationJob.STATUS_QUEUED
+        job.error = error
+        job.locked_at = None
+        job.save(update_fields=['status', 'error', 'locked_at', 'updated_at'])
+        logger.warning(f"Moderation job {job.id} failed (attempt {job.attempts}), requeued: {error}")
+        return
+
+    quarantine(job, job.target, f"Gave up after {job.attempts} attempts: {error}")
+    job.status = ModerationJob.STATUS_FAILED
+    job.save(update_fields=['status', 'updated_at'])
+
+
+def apply_verdict(job, verdict):
+    """Publish or quarantine a job's image according to its detection result."""
+    target = job.target
+    if target is None:
+        logger.info(f"Target of moderation job {job.id} no longer exists, dropping it")
+        job.delete()
+        return
+
+    if isinstance(verdict, ModerationError):
+        quarantine(job, target, str(verdict))
+    elif verdict:
+        quarantine(job, target, "Inappropriate content detected")
+    else:
+        publish(job, target)
+
@@ -0,0 +1,167 @@
+"""Keyset (cursor) pagination.
+
+A page is selected with a WHERE on the sort key of the row it starts after
+(or ends before) rather than an OFFSET, so deep pages cost the same as the
+first, nothing counts the whole result set, and rows added in the meantime
+do not shift the next page. Cursors carry that sort key as URL-safe base64
+JSON, for clients to pass back unread.
+"""
+import base64
+import json
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def pack(data):
+    """Opaque, URL-safe token for JSON-serializable ``data``"""
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def unpack(token):
+    try:
+        return json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except Exception as e:
+        raise InvalidCursor(f"Invalid cursor: {token!r}") from e
+
+
+def _fields(ordering):
+    return [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+
+
+def _reverse(ordering):
+    return [name[1:] if name.startswith('-') else f'-{name}' for name in ordering]
+
+
+def _model_field(model, path):
+    *relations, name = path.split('__')
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    return model._meta.get_field(name)
+
+
+def after(ordering, values):
+    """Filter for the rows that come after ``values`` in ``ordering``"""
+    condition = Q()
+    equal = Q()
+    for (name, descending), value in zip(_fields(ordering), values):
+        condition |= equal & Q(**{f"{name}__{'lt' if descending else 'gt'}": value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+class KeysetPaginator:
+    """Pages through ``queryset`` in ``ordering``, which must end in a unique field.
+
+    Ordering names may follow relations (``profile__plant_count``); the
+    values are read off each object along the same path.
+    """
+
+    def __init__(self, queryset, ordering, per_page=20):
+        self.queryset = queryset
+        self.ordering = list(ordering)
+        self.per_page = per_page
+
+    def page(self, cursor=None):
+        """The page a cursor points to, or the first page; raises InvalidCursor for a bad cursor"""
+        if not cursor:
+            return self._page()
+        data = unpack(cursor)
+        try:
+            [(direction, values)] = data.items()
+            if direction not in ('after', 'before') or len(values) != len(self.ordering):
+                raise ValueError(direction)
+            values = [
+                _model_field(self.queryset.model, name).to_python(value)
+                for (name, _), value in zip(_fields(self.ordering), values)
+            ]
+        except Exception as e:
+            raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
+        return self._page(values, backwards=direction == 'before')
+
+    def get_page(self, cursor=None):
+        """Like page(), but falls back to the first page for a bad cursor"""
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self._page()
+
+    def _page(self, values=None, backwards=False):
+        ordering = _reverse(self.ordering) if backwards else self.ordering
+        queryset = self.queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(after(ordering, values))
+        items = list(queryset[:self.per_page + 1])
+        more = len(items) > self.per_page
+        items = items[:self.per_page]
+
+        if backwards:
+            if not more:
+                # Back at the start: serve a full first page
+                return self._page()
+            items.reverse()
+            has_next, has_previous = True, True
+        else:
+            has_next, has_previous = more, values is not None
+
+        return KeysetPage(
+            items,
+            next_cursor=self._cursor('after', items[-1]) if items and has_next else None,
+            previous_cursor=self._cursor('before', items[0]) if items and has_previous else None,
+        )
+
+    def _cursor(self, direction, obj):
+        values = []
+        for name, _ in _fields(self.ordering):
+            value = obj
+            for attr in name.split('__'):
+                value = getattr(value, attr)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return pack({direction: values})
+
+
+def paginate(request, queryset, ordering, per_page=20):
+    """The page for the request's ``cursor`` parameter, with ``next_url`` and
+    ``previous_url`` query strings that keep its other parameters"""
+    page = KeysetPaginator(queryset, ordering, per_page).get_page(request.GET.get('cursor'))
+    page.next_url = page_url(request, page.next_cursor)
+    page.previous_url = page_url(request, page.previous_cursor)
+    return page
+
+
+def page_url(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return f'?{params.urlencode()}'
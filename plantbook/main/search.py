@@ -0,0 +1,186 @@
+"""Full-text search over plants.
+
+PostgreSQL keeps a weighted ``tsvector`` column on main_plant with a GIN
+index; SQLite (local development) keeps an FTS5 table keyed by plant id.
+Both cover the name, scientific name, description and the plant's detail
+headers and text, and rank matches (names first). Other databases fall back
+to substring matching. The index is updated from model signals and by the
+bulk import helpers, and can be rebuilt with ``manage.py rebuild_search_index``.
+The column, index and table themselves are created by migration 0012.
+"""
+import logging
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Plant, PlantDetail
+from .pagination import InvalidCursor, KeysetPage, pack, unpack
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'main_plant_fts'
+TOKEN_RE = re.compile(r'[^\W_]+')
+
+POSTGRES_DOCUMENT = """
+    setweight(to_tsvector('english', coalesce(p.name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(p.scientific_name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(p.description, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce((
+        SELECT string_agg(d.header || ' ' || d.information, ' ')
+        FROM main_plantdetail d WHERE d.plant_id = p.id
+    ), '')), 'C')
+"""
+
+
+def _vendor():
+    return connection.vendor
+
+
+def _tokens(query):
+    return TOKEN_RE.findall(query.lower())[:10]
+
+
+def index_plants(plant_ids=None):
+    """(Re)index the given plants, or every plant when ``plant_ids`` is None."""
+    if plant_ids is not None:
+        plant_ids = [int(plant_id) for plant_id in plant_ids]
+        if not plant_ids:
+            return
+
+    vendor = _vendor()
+    with connection.cursor() as cursor:
+        if vendor == 'postgresql':
+            where, params = ('WHERE p.id = ANY(%s)', [plant_ids]) if plant_ids is not None else ('', [])
+            cursor.execute(f'UPDATE main_plant p SET search_vector = {POSTGRES_DOCUMENT} {where}', params)
+        elif vendor == 'sqlite':
+            if plant_ids is None:
+                cursor.execute(f'DELETE FROM {FTS_TABLE}')
+                where, params = '', []
+            else:
+                placeholders = ', '.join(['%s'] * len(plant_ids))
+                cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', plant_ids)
+                where, params = f'WHERE p.id IN ({placeholders})', plant_ids
+            cursor.execute(
+                f"""INSERT INTO {FTS_TABLE} (rowid, name, scientific_name, description, details)
+                SELECT p.id, p.name, p.scientific_name, p.description,
+                       (SELECT group_concat(d.header || ' ' || d.information, ' ')
+                        FROM main_plantdetail d WHERE d.plant_id = p.id)
+                FROM main_plant p {where}""",
+                params,
+            )
+
+
+def unindex_plants(plant_ids):
+    # PostgreSQL drops the vector together with the row
+    if _vendor() == 'sqlite' and plant_ids:
+        placeholders = ', '.join(['%s'] * len(plant_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', list(plant_ids))
+
+
+def ranked_plant_ids(query, limit=None, after=None):
+    """(id, rank) of plants matching every word of ``query`` (as prefixes), best match first.
+
+    ``after`` is the (rank, id) of the last result already shown, to fetch
+    the next page by keyset. Ranks are only comparable within one query.
+    """
+    tokens = _tokens(query)
+    if not tokens:
+        return []
+    limit = limit or settings.SEARCH_RESULTS_LIMIT
+    after_rank, after_id = after if after else (None, None)
+    # Higher ts_rank is better on PostgreSQL, lower bm25 on SQLite. ts_rank is a
+    # real; it is selected as float8 so the rank a cursor carries back compares
+    # equal to the one it was read from
+    seek = {'postgresql': 'WHERE rank < %s OR (rank = %s AND id < %s)', 'sqlite': 'WHERE score > %s OR (score = %s AND id < %s)'}
+    seek_params = [after_rank, after_rank, after_id] if after else []
+
+    vendor = _vendor()
+    with connection.cursor() as cursor:
+        if vendor == 'postgresql':
+            tsquery = ' & '.join(f'{token}:*' for token in tokens)
+            cursor.execute(
+                f"""SELECT id, rank FROM (
+                    SELECT p.id, ts_rank(p.search_vector, q)::float8 AS rank FROM main_plant p,
+                           (to_tsquery('english', %s) || to_tsquery('simple', %s)) AS q
+                    WHERE p.search_vector @@ q
+                ) matches
+                {seek['postgresql'] if after else ''}
+                ORDER BY rank DESC, id DESC
+                LIMIT %s""",
+                [tsquery, tsquery, *seek_params, limit],
+            )
+        elif vendor == 'sqlite':
+            match = ' '.join(f'"{token}"*' for token in tokens)
+            cursor.execute(
+                f"""SELECT id, score FROM (
+                    SELECT rowid AS id, bm25({FTS_TABLE}, 10.0, 10.0, 3.0, 1.0) AS score
+                    FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s
+                )
+                {seek['sqlite'] if after else ''}
+                ORDER BY score, id DESC
+                LIMIT %s""",
+                [match, *seek_params, limit],
+            )
+        else:
+            q = Q()
+            for token in tokens:
+                q &= Q(name__icontains=token) | Q(scientific_name__icontains=token)
+            plants = Plant.objects.filter(q)
+            if after_id is not None:
+                plants = plants.filter(id__lt=after_id)
+            return [(plant_id, 0) for plant_id in plants.order_by('-id').values_list('id', flat=True)[:limit]]
+        return cursor.fetchall()
+
+
+def search_plants(query, limit=None, after=None):
+    """Plants matching ``query`` with their owners, in ranking order, each with its ``search_rank``"""
+    ranked = ranked_plant_ids(query, limit, after)
+    plants = Plant.objects.filter(id__in=[plant_id for plant_id, _ in ranked]).select_related('owner').in_bulk()
+    results = []
+    for plant_id, rank in ranked:
+        if plant_id in plants:
+            plants[plant_id].search_rank = rank
+            results.append(plants[plant_id])
+    return results
+
+
+def search_page(query, cursor=None, per_page=None):
+    """A KeysetPage of search results; a bad cursor gives the first page"""
+    per_page = per_page or settings.SEARCH_RESULTS_LIMIT
+    after = None
+    if cursor:
+        try:
+            after = unpack(cursor)
+            rank, plant_id = after
+            after = (float(rank), int(plant_id))
+        except (InvalidCursor, TypeError, ValueError):
+            after = None
+    plants = search_plants(query, per_page + 1, after)
+    next_cursor = None
+    if len(plants) > per_page:
+        plants = plants[:per_page]
+        next_cursor = pack([plants[-1].search_rank, plants[-1].id])
+    return KeysetPage(plants, next_cursor=next_cursor, previous_cursor=None)
+
+
+@receiver(post_save, sender=Plant)
+def _index_saved_plant(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_plants([instance.pk])
+
+
+@receiver(post_delete, sender=Plant)
+def _unindex_deleted_plant(sender, instance, **kwargs):
+    unindex_plants([instance.pk])
+
+
+@receiver(post_save, sender=PlantDetail)
+@receiver(post_delete, sender=PlantDetail)
+def _index_detail_plant(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_plants([instance.plant_id])
@@ -0,0 +1,130 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapses concurrent identical calls into one.
+
+    Within a process, callers of do() with the same key while a call is in
+    flight wait for it and share its result or exception. Across worker
+    processes the leader holds a lock in the shared cache; other workers poll
+    lookup() (normally a read of the cache entry the leader will fill) until
+    the value appears, the lock is released, or wait_timeout runs out, and
+    only then call fn() themselves.
+    """
+
+    def __init__(self, lock_timeout=30, wait_timeout=10, poll_interval=0.05):
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, lookup=None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            logger.debug(f"Waiting for in-flight call: {key}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._do_shared(key, fn, lookup)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stream(self, key, iterate, lookup, wait_timeout=None):
+        """Like do(), for a call that yields its results as they come.
+
+        The leader streams ``iterate()`` and is expected to cache the complete
+        results for ``lookup()``. Everyone else waits for the flight, at most
+        ``wait_timeout`` seconds, then yields what lookup() returns, or runs
+        iterate() themselves if nothing was cached.
+        """
+        wait_timeout = self.wait_timeout if wait_timeout is None else wait_timeout
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            logger.debug(f"Waiting for in-flight stream: {key}")
+            call.done.wait(wait_timeout)
+            value = lookup()
+            yield from (value if value is not None else iterate())
+            return
+
+        try:
+            lock_key = f"singleflight:{key}"
+            if cache.add(lock_key, True, self.lock_timeout):
+                try:
+                    yield from iterate()
+                finally:
+                    cache.delete(lock_key)
+            else:
+                value = self._wait_for(key, lookup, wait_timeout)
+                yield from (value if value is not None else iterate())
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _do_shared(self, key, fn, lookup):
+        if lookup is None or cache.add(f"singleflight:{key}", True, self.lock_timeout):
+            try:
+                return fn()
+            finally:
+                if lookup is not None:
+                    cache.delete(f"singleflight:{key}")
+
+        value = self._wait_for(key, lookup, self.wait_timeout)
+        return value if value is not None else fn()
+
+    def _wait_for(self, key, lookup, wait_timeout):
+        """Poll lookup() while another worker holds the lock; None if it never fills"""
+        logger.debug(f"Another worker is fetching {key}, waiting for its result")
+        lock_key = f"singleflight:{key}"
+        deadline = time.monotonic() + wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            value = lookup()
+            if value is not None:
+                return value
+            if cache.get(lock_key) is None:
+                # Either the value landed just before the lock was released, or
+                # the other worker finished without caching anything (or died)
+                return lookup()
+        return None
+
+
+# Shared by the API clients in utils
+single_flight = SingleFlight(
+    lock_timeout=settings.SINGLE_FLIGHT_LOCK_TIMEOUT,
+    wait_timeout=settings.SINGLE_FLIGHT_WAIT_TIMEOUT,
+)
@@ -0,0 +1,246 @@
+"""Typeahead suggestions for local plants.
+
+Every worker keeps the names and scientific names of all plants in memory as
+a sorted list of (term, plant id) pairs, so a lookup is a bisect followed by
+a short scan. A plant's terms are each of its names from every word onwards,
+so "tom" finds "Cherry Tomato" as well as "Tomatillo".
+
+Plant signals update the index of the worker that made the change once the
+transaction commits, take the next version number from a counter in the
+shared cache and store the ids that changed under it. The counter is only
+ever moved by the cache's atomic incr(), so concurrent changes always get
+versions of their own. Other workers compare versions at most every
+SUGGEST_INDEX_SYNC_INTERVAL seconds and reload just those plants, or rebuild
+the whole index if they have missed changes.
+"""
+import bisect
+import itertools
+import logging
+import re
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Plant
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'suggest_index:version'
+CHANGE_KEY = 'suggest_index:change:{}'
+CHANGE_TTL = 60 * 60
+# Workers further behind than this rebuild instead of replaying changes
+MAX_REPLAY = 200
+# A change is written just after its version is taken; a worker waits this
+# many seconds for a missing one before assuming it expired and rebuilding
+CHANGE_WRITE_GRACE = 5
+
+WORD_RE = re.compile(r'[^\W_]+')
+
+
+def normalize(text):
+    """Lowercased words of ``text`` without accents, joined by single spaces"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(WORD_RE.findall(text.casefold()))
+
+
+def plant_terms(name, scientific_name):
+    terms = set()
+    for text in (name, scientific_name):
+        words = normalize(text).split(' ')
+        terms.update(' '.join(words[i:]) for i in range(len(words)))
+    terms.discard('')
+    return terms
+
+
+class PrefixIndex:
+    def __init__(self, sync_interval=1.0):
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._terms = []
+        self._plants = {}
+        self._version = None
+        self._next_sync = 0.0
+        # (version, first seen missing) of a change not yet in the cache
+        self._missing = None
+
+    @property
+    def built(self):
+        return self._version is not None
+
+    def warm_up(self):
+        """Build the index now rather than on the first lookup"""
+        try:
+            self.build()
+        except Exception as e:
+            logger.error(f"Error building plant suggestion index: {str(e)}")
+
+    def build(self):
+        with self._build_lock:
+            # Read the version first so changes made during the load are replayed
+            version = _shared_version()
+            start = time.monotonic()
+            plants = {}
+            terms = []
+            rows = Plant.objects.values_list('id', 'name', 'scientific_name').iterator(chunk_size=2000)
+            for plant_id, name, scientific_name in rows:
+                keys = plant_terms(name, scientific_name)
+                plants[plant_id] = (name, scientific_name, keys)
+                terms.extend((term, plant_id) for term in keys)
+            terms.sort()
+
+            with self._lock:
+                self._terms = terms
+                self._plants = plants
+                self._version = version
+                self._next_sync = time.monotonic() + self.sync_interval
+                self._missing = None
+            logger.info(f"Built plant suggestion index: {len(plants)} plants, {len(terms)} terms "
+                        f"in {time.monotonic() - start:.2f}s")
+
+    def suggest(self, query, limit=None):
+        """Plants with a name or scientific name containing a word starting with ``query``"""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        limit = limit or settings.SUGGEST_RESULTS_LIMIT
+        self._sync()
+
+        results = []
+        seen = set()
+        with self._lock:
+            i = bisect.bisect_left(self._terms, (prefix,))
+            while i < len(self._terms) and len(results) < limit:
+                term, plant_id = self._terms[i]
+                if not term.startswith(prefix):
+                    break
+                if plant_id not in seen:
+                    seen.add(plant_id)
+                    name, scientific_name, _ = self._plants[plant_id]
+                    results.append({'id': plant_id, 'name': name, 'scientific_name': scientific_name})
+                i += 1
+        return results
+
+    def plants_changed(self, plants=(), deleted_ids=()):
+        """Apply saved or deleted plants here once committed and tell the other workers."""
+        entries = [(plant.pk, plant.name, plant.scientific_name) for plant in plants]
+        deleted_ids = list(deleted_ids)
+
+        def apply():
+            if self.built:
+                with self._lock:
+                    self._apply(entries, deleted_ids)
+            version = _publish([entry[0] for entry in entries] + deleted_ids)
+            if version is not None:
+                with self._lock:
+                    # Only move forward if no other worker's change is still to be replayed
+                    if self._version == version - 1:
+                        self._version = version
+
+        transaction.on_commit(apply)
+
+    def _apply(self, entries, deleted_ids):
+        for plant_id, name, scientific_name in entries:
+            self._remove(plant_id)
+            terms = plant_terms(name, scientific_name)
+            self._plants[plant_id] = (name, scientific_name, terms)
+            for term in terms:
+                bisect.insort(self._terms, (term, plant_id))
+        for plant_id in deleted_ids:
+            self._remove(plant_id)
+
+    def _remove(self, plant_id):
+        entry = self._plants.pop(plant_id, None)
+        if entry is None:
+            return
+        for term in entry[2]:
+            i = bisect.bisect_left(self._terms, (term, plant_id))
+            if i < len(self._terms) and self._terms[i] == (term, plant_id):
+                del self._terms[i]
+
+    def _sync(self):
+        if not self.built:
+            self.build()
+            return
+        now = time.monotonic()
+        if now < self._next_sync:
+            return
+        self._next_sync = now + self.sync_interval
+
+        version = _shared_version()
+        if version == self._version:
+            return
+        if version < self._version or version - self._version > MAX_REPLAY:
+            self.build()
+            return
+
+        start = self._version
+        keys = [CHANGE_KEY.format(v) for v in range(start + 1, version + 1)]
+        changes = cache.get_many(keys)
+        # Replay up to the first missing change, which may still be being written
+        replay = list(itertools.takewhile(changes.__contains__, keys))
+        if len(replay) < len(keys):
+            missing = start + len(replay) + 1
+            if self._missing is None or self._missing[0] != missing:
+                self._missing = (missing, now)
+            elif now - self._missing[1] > CHANGE_WRITE_GRACE:
+                logger.info("Plant suggestion changes expired from the cache, rebuilding the index")
+                self.build()
+                return
+        if not replay:
+            return
+
+        synced = start + len(replay)
+        plant_ids = {plant_id for key in replay for plant_id in changes[key]}
+        entries = list(Plant.objects.filter(id__in=plant_ids).values_list('id', 'name', 'scientific_name'))
+        deleted_ids = plant_ids - {entry[0] for entry in entries}
+        with self._lock:
+            self._apply(entries, deleted_ids)
+            self._version = max(self._version, synced)
+        logger.debug(f"Plant suggestion index synced to version {synced} ({len(plant_ids)} plants)")
+
+
+def _shared_version():
+    return cache.get(VERSION_KEY) or 0
+
+
+def _publish(plant_ids):
+    """Store a change under the next version; returns the version, or None if the cache failed"""
+    if not plant_ids:
+        return None
+    try:
+        try:
+            version = cache.incr(VERSION_KEY)
+        except ValueError:
+            # No counter yet, or it was evicted. Whichever worker's add() wins
+            # starts it, and every incr() still returns a version of its own
+            cache.add(VERSION_KEY, 0, None)
+            version = cache.incr(VERSION_KEY)
+        cache.set(CHANGE_KEY.format(version), list(plant_ids), CHANGE_TTL)
+        return version
+    except Exception as e:
+        # Other workers catch up on their next rebuild
+        logger.error(f"Error publishing plant suggestion change: {str(e)}")
+        return None
+
+
+plant_suggestions = PrefixIndex(sync_interval=settings.SUGGEST_INDEX_SYNC_INTERVAL)
+
+
+@receiver(post_save, sender=Plant)
+def _plant_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not {'name', 'scientific_name'} & set(update_fields)):
+        return
+    plant_suggestions.plants_changed(plants=[instance])
+
+
+@receiver(post_delete, sender=Plant)
+def _plant_deleted(sender, instance, **kwargs):
+    plant_suggestions.plants_changed(deleted_ids=[instance.pk])
@@ -1,3 +1,828 @@
-from django.test import TestCase
+import io
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import skipUnless
+from unittest.mock import Mock, patch
 
-# Create your tests here.
+import requests
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import views
+from .cache_backends import MeteredFileBasedCache
+from .counters import recount
+from .ingestion import create_plants_from_permapeople, merge_permapeople_details
+from .management.commands.moderation_worker import Command as ModerationWorker
+from .models import Comment, ModerationJob, Observation, Plant, PlantDetail, PlantPhoto, Profile, MODERATION_QUARANTINED
+from .moderation import (
+    DetectorPool, DetectorPoolTimeout, check_batch, claim_jobs, decode_image, fail_job, queue_for_moderation,
+    requeue_stale_jobs,
+)
+from .pagination import pack
+from .search import ranked_plant_ids, search_page
+from .singleflight import SingleFlight
+from .suggest import CHANGE_KEY, VERSION_KEY, PrefixIndex, _publish
+from .utils import TrefleAPI
+
+# Fragments are cached under per-plant versions, which must not outlive the test database
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Views run in a transaction, as under the project's ATOMIC_REQUESTS, whatever
+# database the tests are pointed at. Inside a TestCase that transaction is a
+# SAVEPOINT and a RELEASE, which the query budgets below include
+atomic_requests = patch.dict(connection.settings_dict, {'ATOMIC_REQUESTS': True})
+
+
+@atomic_requests
+@override_settings(CACHES=TEST_CACHES)
+class PlantDetailQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='password')
+        cls.plant = Plant.objects.create(
+            owner=cls.owner,
+            name='Tomato',
+            scientific_name='Solanum lycopersicum',
+            description='A tender annual.',
+        )
+        PlantDetail.objects.create(plant=cls.plant, header='Soil', information='Rich and well drained')
+        Observation.objects.create(plant=cls.plant, note='First flowers')
+        PlantPhoto.objects.create(plant=cls.plant, caption='Seedlings')
+        cls.url = reverse('main:plant_detail', args=[cls.plant.id])
+
+    def setUp(self):
+        cache.clear()
+
+    def add_thread(self, replies):
+        author = User.objects.create_user(f'commenter{Comment.objects.count()}')
+        comment = Comment.objects.create(plant=self.plant, author=author, content=f'Comment by {author.username}')
+        for i in range(replies):
+            replier = User.objects.create_user(f'{author.username}-reply{i}')
+            Comment.objects.create(plant=self.plant, author=replier, parent=comment, content=f'Reply by {replier.username}')
+
+    def test_query_count_does_not_grow_with_comments(self):
+        # Savepoint, session, user and header profile, then the plant, a page
+        # of comments with their authors, every reply in their threads and
+        # the savepoint's release
+        self.client.force_login(self.owner)
+        self.add_thread(replies=1)
+        with self.assertNumQueries(8):
+            response = self.client.get(self.url, {'tab': 'comments'})
+        self.assertEqual(response.status_code, 200)
+
+        for _ in range(5):
+            self.add_thread(replies=3)
+        with self.assertNumQueries(8):
+            response = self.client.get(self.url, {'tab': 'comments'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Reply by commenter6-reply2')
+
+    def test_query_count_does_not_grow_with_reply_depth(self):
+        self.client.force_login(self.owner)
+        comment = Comment.objects.create(plant=self.plant, author=self.owner, content='Depth 0')
+        for depth in range(1, 7):
+            comment = Comment.objects.create(plant=self.plant, author=self.owner, parent=comment, content=f'Depth {depth}')
+            with self.assertNumQueries(8):
+                response = self.client.get(self.url, {'tab': 'comments'})
+            self.assertContains(response, f'Depth {depth}')
+        self.assertEqual(response.content.decode().count('class="comment-replies"'), 6)
+
+    def test_replies_are_nested_under_their_comment(self):
+        self.add_thread(replies=2)
+        html = self.client.get(self.url, {'tab': 'comments'}).context['tab_html']
+        self.assertEqual(html.count('class="comment-replies"'), 1)
+        self.assertLess(html.index('Comment by commenter0'), html.index('class="comment-replies"'))
+        self.assertLess(html.index('class="comment-replies"'), html.index('Reply by commenter0-reply0'))
+        self.assertLess(html.index('Reply by commenter0-reply0'), html.index('Reply by commenter0-reply1'))
+
+    @override_settings(PLANT_TAB_PAGE_SIZE=2)
+    def test_tab_pages_follow_cursor_to_the_end(self):
+        for i in range(4):
+            Observation.objects.create(plant=self.plant, note=f'Note {i}')
+        notes = list(Observation.objects.filter(plant=self.plant).order_by('-created_at', '-id').values_list('note', flat=True))
+
+        response = self.client.get(self.url, {'tab': 'observations'})
+        pages = [response.context['tab_html']]
+        next_url = response.context['tab_next_url']
+        while next_url:
+            data = self.client.get(next_url).json()
+            pages.append(data['html'])
+            next_url = data['next_url']
+        seen = [note for html in pages for note in notes if f'<p>{note}</p>' in html]
+        self.assertEqual(seen, notes)
+
+    def test_tab_rejects_invalid_cursor(self):
+        url = reverse('main:plant_tab', args=[self.plant.id, 'observations'])
+        self.assertEqual(self.client.get(url, {'cursor': 'not-a-cursor'}).status_code, 400)
+
+
+@atomic_requests
+@override_settings(CACHES=TEST_CACHES)
+class PlantFragmentCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='password')
+        cls.plant = Plant.objects.create(owner=cls.owner, name='Basil', scientific_name='Ocimum basilicum', is_public=True)
+        PlantDetail.objects.create(plant=cls.plant, header='Light', information='Full sun')
+        cls.url = reverse('main:plant_detail', args=[cls.plant.id])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_views_render_from_cache_until_the_plant_changes(self):
+        self.client.get(self.url)
+        # Only the plant itself is read once its fragments are cached, inside the request's savepoint
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Full sun')
+
+        PlantDetail.objects.create(plant=self.plant, header='Water', information='Keep moist')
+        self.assertContains(self.client.get(self.url), 'Keep moist')
+
+        plant = Plant.objects.get(pk=self.plant.pk)
+        plant.name = 'Sweet basil'
+        plant.save()
+        self.assertContains(self.client.get(self.url), '<h1>Sweet basil</h1>')
+
+    def test_saving_a_stale_copy_never_rewinds_the_version(self):
+        stale = Plant.objects.get(pk=self.plant.pk)
+        self.client.get(self.url)
+        PlantDetail.objects.create(plant=self.plant, header='Water', information='Keep moist')
+        self.assertContains(self.client.get(self.url), 'Keep moist')
+
+        version = Plant.objects.get(pk=self.plant.pk).fragment_version
+        stale.name = 'Sweet basil'
+        stale.save()
+        self.assertEqual(stale.fragment_version, version + 1)
+        stale.save(update_fields=['name'])
+        self.assertEqual(Plant.objects.get(pk=self.plant.pk).fragment_version, version + 2)
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Keep moist')
+        self.assertContains(response, '<h1>Sweet basil</h1>')
+
+    def test_renaming_a_commenter_refreshes_the_cached_comments(self):
+        fan = User.objects.create_user('fan', first_name='Ann')
+        Comment.objects.create(plant=self.plant, author=fan, content='Smells great')
+        self.assertContains(self.client.get(self.url, {'tab': 'comments'}), 'Ann')
+
+        # A login saves the user and their profile without changing what comments show
+        version = Plant.objects.get(pk=self.plant.pk).fragment_version
+        self.client.force_login(fan)
+        self.client.logout()
+        self.assertEqual(Plant.objects.get(pk=self.plant.pk).fragment_version, version)
+
+        fan = User.objects.get(pk=fan.pk)
+        fan.first_name = 'Annie'
+        fan.save()
+        self.assertContains(self.client.get(self.url, {'tab': 'comments'}), 'Annie')
+
+    def test_owner_is_never_served_the_public_fragment(self):
+        self.client.get(self.url)
+        self.client.force_login(self.owner)
+        self.assertContains(self.client.get(self.url), 'delete-form')
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+        self.fan = User.objects.create_user('fan')
+        self.plant = Plant.objects.create(owner=self.owner, name='Mint', scientific_name='Mentha')
+
+    def assertCounts(self, plants, likes, comments):
+        self.plant.refresh_from_db()
+        self.assertEqual(Profile.objects.get(user=self.owner).plant_count, plants)
+        self.assertEqual((self.plant.like_count, self.plant.comment_count), (likes, comments))
+
+    def test_signals_keep_counters_current(self):
+        self.plant.likes.add(self.owner, self.fan)
+        self.fan.liked_plants.remove(self.plant)
+        comment = Comment.objects.create(plant=self.plant, author=self.fan, content='Smells great')
+        Comment.objects.create(plant=self.plant, author=self.owner, parent=comment, content='Thanks')
+        self.assertCounts(plants=1, likes=1, comments=2)
+
+        comment.delete()
+        self.plant.likes.clear()
+        Plant.objects.create(owner=self.owner, name='Sage', scientific_name='Salvia officinalis')
+        self.assertCounts(plants=2, likes=0, comments=0)
+
+    def test_recount_repairs_drift(self):
+        self.plant.likes.add(self.fan)
+        Plant.objects.filter(pk=self.plant.pk).update(like_count=5)
+        Profile.objects.filter(user=self.owner).update(plant_count=0)
+
+        self.assertEqual(recount(), {'Profile': 1, 'Plant': 1})
+        self.assertCounts(plants=1, likes=1, comments=0)
+
+
+@atomic_requests
+@override_settings(CACHES=TEST_CACHES, PLANTS_PER_PAGE=2)
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='password')
+        for i in range(5):
+            Plant.objects.create(owner=cls.owner, name=f'Plant {i}', scientific_name=f'Planta {i}')
+
+    def test_my_plants_pages_cost_the_same_and_cover_every_plant(self):
+        self.client.force_login(self.owner)
+        names, url = [], reverse('main:my_plants')
+        while url:
+            # Savepoint, session, user, header profile, one page of plants and
+            # the release, however deep the page
+            with self.assertNumQueries(6):
+                page = self.client.get(url).context['plants']
+            names += [plant.name for plant in page]
+            url = page.next_url and reverse('main:my_plants') + page.next_url
+        self.assertEqual(names, [f'Plant {i}' for i in reversed(range(5))])
+
+    def test_directory_steps_back_to_the_first_page(self):
+        for i in range(3):
+            User.objects.create_user(f'gardener{i}')
+        first = self.client.get(reverse('main:directory'), {'per_page': 2}).context['profiles']
+        second = self.client.get(reverse('main:directory') + first.next_url).context['profiles']
+        # The owner's five plants put them first, then the rest by user id
+        self.assertEqual([profile.user.username for profile in first], ['owner', 'gardener0'])
+        self.assertEqual([profile.user.username for profile in second], ['gardener1', 'gardener2'])
+        back = self.client.get(reverse('main:directory') + second.previous_url).context['profiles']
+        self.assertEqual([profile.pk for profile in back], [profile.pk for profile in first])
+        self.assertIsNone(back.previous_url)
+
+    def test_directory_skips_users_without_a_profile(self):
+        for i in range(3):
+            User.objects.create_user(f'gardener{i}')
+        Profile.objects.filter(user__username='gardener0').delete()
+        names, url = [], reverse('main:directory') + '?per_page=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            page = response.context['profiles']
+            names += [profile.user.username for profile in page]
+            url = page.next_url and reverse('main:directory') + page.next_url
+        self.assertEqual(names, ['owner', 'gardener1', 'gardener2'])
+
+    def test_directory_search_matches_user_names(self):
+        User.objects.create_user('gardener', first_name='Rosa', last_name='Canina')
+        response = self.client.get(reverse('main:directory'), {'q': 'canina'})
+        self.assertEqual([profile.user.username for profile in response.context['profiles']], ['gardener'])
+
+
+class DetectorPoolTests(SimpleTestCase):
+    def pool(self, size, **kwargs):
+        pool = DetectorPool(size=size, **kwargs)
+        pool._create_detector = lambda: object()
+        return pool
+
+    def test_concurrent_callers_never_share_a_detector(self):
+        pool = self.pool(size=2)
+        lock = threading.Lock()
+        holders = {}
+        peak = []
+
+        def borrow():
+            with pool.acquire(timeout=5) as detector:
+                with lock:
+                    self.assertNotIn(id(detector), holders)
+                    holders[id(detector)] = detector
+                    peak.append(len(holders))
+                time.sleep(0.01)
+                with lock:
+                    del holders[id(detector)]
+
+        threads = [threading.Thread(target=borrow) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertLessEqual(max(peak), 2)
+        stats = pool.stats()
+        self.assertEqual((stats['loaded'], stats['idle'], stats['acquisitions']), (2, 2, 8))
+
+    def test_checkout_times_out_when_every_detector_is_busy(self):
+        pool = self.pool(size=1)
+        with pool.acquire():
+            with self.assertRaises(DetectorPoolTimeout):
+                with pool.acquire(timeout=0.01):
+                    pass
+        with pool.acquire(timeout=0.01):
+            pass
+
+    def test_failed_load_frees_its_slot(self):
+        pool = self.pool(size=1)
+        pool._create_detector = lambda: 1 / 0
+        with self.assertRaises(ZeroDivisionError):
+            with pool.acquire():
+                pass
+        pool._create_detector = lambda: object()
+        with pool.acquire(timeout=0.01):
+            self.assertEqual(pool.stats()['loaded'], 1)
+
+
+class ImageDecodeTests(SimpleTestCase):
+    def gif(self, size):
+        data = io.BytesIO()
+        Image.new('RGB', size, (255, 0, 0)).save(data, 'GIF')
+        return data.getvalue()
+
+    def test_gifs_are_decoded_and_downscaled(self):
+        small = decode_image(self.gif((100, 50)))
+        self.assertEqual(small.shape, (50, 100, 3))
+        self.assertEqual(list(small[0, 0]), [0, 0, 255])
+        self.assertEqual(decode_image(self.gif((2600, 1300))).shape, (325, 650, 3))
+
+    @patch('main.moderation.cache_verdicts')
+    @patch('main.moderation.get_cached_verdicts', return_value={})
+    @patch('main.moderation.detect_batch', side_effect=lambda images: [[] for _ in images])
+    def test_gif_uploads_are_checked_rather_than_quarantined(self, detect_batch, *mocks):
+        self.assertEqual(check_batch([self.gif((100, 50)), b'not an image'])[0], False)
+        self.assertEqual(len(detect_batch.call_args.args[0]), 1)
+
+
+class ModerationQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('owner')
+        cls.plant = Plant.objects.create(owner=owner, name='Fern', scientific_name='Polypodiopsida')
+
+    def queue(self, count):
+        observations = [Observation.objects.create(plant=self.plant, note=f'Note {i}') for i in range(count)]
+        return [queue_for_moderation(observation, 'image', data=b'image') for observation in observations]
+
+    def test_claimed_jobs_are_not_claimed_again(self):
+        jobs = self.queue(3)
+        first = claim_jobs(limit=2)
+        second = claim_jobs(limit=2)
+        self.assertEqual([job.id for job in first], [job.id for job in jobs[:2]])
+        self.assertEqual([job.id for job in second], [jobs[2].id])
+        self.assertEqual(claim_jobs(limit=2), [])
+        self.assertTrue(all(job.status == ModerationJob.STATUS_PROCESSING and job.attempts == 1 for job in first + second))
+
+    def test_job_taken_by_another_worker_is_skipped(self):
+        jobs = self.queue(3)
+        update = QuerySet.update
+        raced = []
+
+        def racing_update(queryset, **kwargs):
+            if not raced:
+                # Another worker claims the first candidate just before this one does
+                raced.append(update(queryset, **kwargs))
+            return update(queryset, **kwargs)
+
+        with patch.object(QuerySet, 'update', racing_update):
+            claimed = claim_jobs(limit=2)
+        self.assertEqual([job.id for job in claimed], [job.id for job in jobs[1:]])
+
+    def test_failing_job_is_retried_then_quarantined(self):
+        [job] = self.queue(1)
+        for attempt in range(1, 3):
+            [job] = claim_jobs()
+            fail_job(job, 'Upload timed out', max_attempts=2)
+            job.refresh_from_db()
+            if attempt == 1:
+                self.assertEqual((job.status, job.locked_at), (ModerationJob.STATUS_QUEUED, None))
+
+        self.assertEqual(job.status, ModerationJob.STATUS_FAILED)
+        self.assertEqual(job.error, 'Gave up after 2 attempts: Upload timed out')
+        self.assertEqual(Observation.objects.get(pk=job.object_id).moderation_status, MODERATION_QUARANTINED)
+
+    def test_stale_processing_jobs_are_requeued(self):
+        self.queue(2)
+        stale, fresh = claim_jobs(limit=2)
+        ModerationJob.objects.filter(pk=stale.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale_jobs(timedelta(minutes=10)), 1)
+        self.assertEqual([job.id for job in claim_jobs(limit=2)], [stale.id])
+
+
+class ModerationWorkerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('owner')
+        cls.plant = Plant.objects.create(owner=owner, name='Fern', scientific_name='Polypodiopsida')
+
+    def run_worker(self, **options):
+        worker = ModerationWorker()
+        worker.options = {'batch_size': 1, 'batch_timeout': 0, 'poll_interval': 0, 'max_attempts': 3, 'once': True,
+                          **options}
+        worker.stopping = threading.Event()
+        # Run in this thread, inside the test's transaction
+        with patch('main.management.commands.moderation_worker.connection'), \
+                patch('main.management.commands.moderation_worker.close_old_connections'):
+            worker._run()
+
+    @patch('main.moderation.publish')
+    @patch('main.moderation.cache_verdicts')
+    @patch('main.moderation.get_cached_verdicts', return_value={})
+    @patch('main.moderation.detect_batch', side_effect=lambda images: [[] for _ in images])
+    def test_queued_jobs_are_scored_in_batches(self, detect_batch, get_cached_verdicts, cache_verdicts, publish):
+        for width in range(10, 60, 10):
+            data = io.BytesIO()
+            Image.new('RGB', (width, 10)).save(data, 'PNG')
+            observation = Observation.objects.create(plant=self.plant, note=f'{width}px')
+            queue_for_moderation(observation, 'image', data=data.getvalue())
+
+        self.run_worker(batch_size=4)
+        self.assertEqual([len(call.args[0]) for call in detect_batch.call_args_list], [4, 1])
+        self.assertEqual(publish.call_count, 5)
+
+
+@override_settings(CACHES=TEST_CACHES, MODERATION_ASYNC=True)
+class IngestionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner')
+
+    def records(self, count):
+        return [
+            {
+                'name': f'Kale {i}',
+                'scientific_name': 'Brassica oleracea',
+                'description': 'Leafy',
+                'image_url': f'https://example.com/kale{i}.jpg' if i % 2 else '',
+                'data': [{'key': 'soil_type', 'value': 'Loam'}, {'key': 'edible', 'value': ''}],
+            }
+            for i in range(count)
+        ]
+
+    def test_bulk_create_costs_the_same_for_any_number_of_records(self):
+        # Content types are cached per process after the first lookup
+        ContentType.objects.get_for_model(Plant)
+        with CaptureQueriesContext(connection) as small:
+            create_plants_from_permapeople(self.owner, self.records(2))
+        with self.assertNumQueries(len(small)):
+            plants = create_plants_from_permapeople(self.owner, self.records(6))
+
+        self.assertEqual([plant.name for plant in plants], [f'Kale {i}' for i in range(6)])
+        self.assertEqual(Profile.objects.get(user=self.owner).plant_count, 8)
+        self.assertEqual(
+            list(plants[1].details.order_by('id').values_list('header', 'information')),
+            [('Description', 'Leafy'), ('Soil Type', 'Loam')],
+        )
+        queued = ModerationJob.objects.filter(object_id__in=[plant.pk for plant in plants])
+        self.assertEqual(sorted(queued.values_list('source_url', flat=True)),
+                         [f'https://example.com/kale{i}.jpg' for i in (1, 3, 5)])
+
+    def test_merge_updates_existing_details_and_adds_new_ones(self):
+        plant = Plant.objects.create(owner=self.owner, name='Chard', scientific_name='Beta vulgaris')
+        older = PlantDetail.objects.create(plant=plant, header='Soil Type', information='Clay')
+        newer = PlantDetail.objects.create(plant=plant, header='Soil Type', information='Clay')
+        PlantDetail.objects.create(plant=plant, header='Height', information='50cm')
+
+        record = {'data': [
+            {'key': 'soil_type', 'value': 'Loam'},
+            {'key': 'height', 'value': '50cm'},
+            {'key': 'spacing', 'value': '30cm'},
+        ]}
+        self.assertEqual(merge_permapeople_details(plant, record), (1, 1))
+        older.refresh_from_db()
+        newer.refresh_from_db()
+        self.assertEqual((older.information, newer.information), ('Loam', 'Clay'))
+        self.assertTrue(plant.details.filter(header='Spacing', information='30cm').exists())
+        self.assertEqual(merge_permapeople_details(plant, record), (0, 0))
+
+
+@override_settings(CACHES=TEST_CACHES, HEALTH_CHECK_TOKEN='s3cret')
+class HealthTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        with patch.dict(os.environ, {'TREFLE_TOKEN': 'token'}):
+            self.trefle = TrefleAPI()
+        patcher = patch.object(views, 'trefle_api', self.trefle)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.url = reverse('main:health')
+
+    def test_only_staff_and_token_holders_see_it(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+
+        self.client.force_login(User.objects.create_user('gardener'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_reports_cached_token_state_without_calling_trefle(self):
+        with patch.object(self.trefle, '_make_request') as probe:
+            response = self.client.get(self.url, HTTP_AUTHORIZATION='Bearer s3cret')
+        probe.assert_not_called()
+        self.assertIsNone(response.json()['trefle']['token_valid'])
+
+    def test_unreachable_trefle_is_not_probed_again_until_the_recheck(self):
+        with patch.object(self.trefle, '_make_request', side_effect=requests.exceptions.ConnectionError()) as probe:
+            self.assertIsNone(self.trefle.check_authentication())
+            self.assertIsNone(self.trefle.check_authentication())
+        self.assertEqual(probe.call_count, 1)
+        self.assertEqual(self.trefle.health()['error'], 'Trefle API is unreachable')
+
+
+class FileCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = MeteredFileBasedCache(directory.name, {'OPTIONS': {'MAX_ENTRIES': 5}})
+
+    def run_threads(self, target, count=8):
+        threads = [threading.Thread(target=target) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_only_one_concurrent_add_wins(self):
+        added = []
+        self.run_threads(lambda: added.append(self.cache.add('lock', os.getpid(), 10)))
+        self.assertEqual(sorted(added), [False] * 7 + [True])
+
+    def test_concurrent_increments_are_not_lost(self):
+        self.cache.set('version', 0, None)
+        versions = []
+        self.run_threads(lambda: versions.extend(self.cache.incr('version') for _ in range(5)))
+        self.assertEqual(sorted(versions), list(range(1, 41)))
+        # A counter without expiry keeps none
+        with open(self.cache._key_to_file('version'), 'rb') as f:
+            self.assertIsNone(pickle.load(f))
+
+    def test_incr_of_a_missing_key_raises(self):
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_culls_at_most_once_per_interval(self):
+        with patch.object(self.cache, '_list_cache_files', wraps=self.cache._list_cache_files) as listing:
+            for i in range(20):
+                self.cache.set(f'key{i}', i)
+        self.assertEqual(listing.call_count, 1)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.flight = SingleFlight(lock_timeout=1, wait_timeout=5, poll_interval=0.01)
+
+    def run_concurrently(self, fn, callers=5):
+        """Call do() from several threads while ``fn`` is held back; returns each caller's result or exception"""
+        release = threading.Event()
+        calls = []
+
+        def held_fn():
+            calls.append(1)
+            release.wait(5)
+            return fn()
+
+        outcomes = [None] * callers
+
+        def call(i):
+            try:
+                outcomes[i] = self.flight.do('key', held_fn, lookup=lambda: None)
+            except Exception as e:
+                outcomes[i] = e
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+        return calls, outcomes
+
+    def test_concurrent_callers_share_one_call(self):
+        result = object()
+        calls, outcomes = self.run_concurrently(lambda: result)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(outcome is result for outcome in outcomes))
+        self.assertIsNone(cache.get('singleflight:key'))
+
+    def test_exception_reaches_every_waiter(self):
+        error = ValueError('upstream failed')
+
+        def fail():
+            raise error
+
+        calls, outcomes = self.run_concurrently(fail)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(outcome is error for outcome in outcomes))
+        self.assertIsNone(cache.get('singleflight:key'))
+
+    def test_waits_for_another_workers_result(self):
+        # Another worker holds the lock and caches its result shortly
+        cache.add('singleflight:key', True, 1)
+        threading.Timer(0.05, cache.set, args=('value', 'cached')).start()
+        fn = Mock()
+        self.assertEqual(self.flight.do('key', fn, lookup=lambda: cache.get('value')), 'cached')
+        fn.assert_not_called()
+
+    def test_fetches_itself_once_another_workers_lock_expires(self):
+        # The worker holding the lock died without caching anything
+        cache.add('singleflight:key', True, 1)
+        start = time.monotonic()
+        self.assertEqual(self.flight.do('key', lambda: 'fetched', lookup=lambda: None), 'fetched')
+        self.assertLess(time.monotonic() - start, self.flight.wait_timeout)
+
+    def test_fetches_itself_when_the_wait_times_out(self):
+        self.flight.wait_timeout = 0.05
+        cache.add('singleflight:key', True, 60)
+        self.assertEqual(self.flight.do('key', lambda: 'fetched', lookup=lambda: None), 'fetched')
+
+    def test_stream_waiters_read_what_the_leader_cached(self):
+        release = threading.Event()
+        runs = []
+
+        def iterate():
+            runs.append(1)
+            yield 'first'
+            release.wait(5)
+            yield 'second'
+            cache.set('value', ['first', 'second'])
+
+        leader = self.flight.stream('key', iterate, lambda: cache.get('value'))
+        self.assertEqual(next(leader), 'first')
+        waited = []
+        waiter = threading.Thread(
+            target=lambda: waited.extend(self.flight.stream('key', iterate, lambda: cache.get('value'))))
+        waiter.start()
+        time.sleep(0.05)
+        release.set()
+        self.assertEqual(list(leader), ['second'])
+        waiter.join()
+        self.assertEqual((waited, len(runs)), (['first', 'second'], 1))
+        self.assertIsNone(cache.get('singleflight:key'))
+
+
+@atomic_requests
+@override_settings(CACHES=TEST_CACHES)
+class PermaPeopleStreamTests(TestCase):
+    def test_results_are_sent_as_they_resolve(self):
+        progress = []
+
+        def iter_search(query):
+            for plant_id in (1, 2):
+                progress.append(plant_id)
+                yield {'id': plant_id, 'name': f'Plant {plant_id}', 'data': []}
+
+        with patch.object(views.permapeople_api, 'iter_search', iter_search):
+            response = self.client.get(reverse('main:permapeople_search_stream'), {'q': 'mint'})
+            lines = iter(response.streaming_content)
+            self.assertEqual(json.loads(next(lines))['id'], 1)
+            # The second lookup has not even started when the first line goes out
+            self.assertEqual(progress, [1])
+            self.assertEqual([json.loads(line) for line in lines][-1], {'done': True, 'count': 2})
+
+    def test_concurrent_cold_searches_share_one_fan_out(self):
+        cache.clear()
+        api = views.permapeople_api
+        release = threading.Event()
+
+        def search_hits(query):
+            release.wait(5)
+            return [1, 2], {1: None, 2: None}
+
+        results = []
+        with patch.object(api, 'search_hits', Mock(side_effect=search_hits)) as hits, \
+                patch.object(api, '_get_search_result', lambda plant_id, updated_at: {'id': plant_id}):
+            threads = [threading.Thread(target=lambda: results.append(list(api.iter_search('mint')))) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            time.sleep(0.1)
+            release.set()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(hits.call_count, 1)
+        self.assertEqual([sorted(plant['id'] for plant in found) for found in results], [[1, 2]] * 3)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner')
+        cls.by_name = Plant.objects.create(owner=cls.owner, name='Rosemary', scientific_name='Salvia rosmarinus',
+                                           description='Evergreen shrub')
+        cls.by_description = Plant.objects.create(owner=cls.owner, name='Herb spiral', scientific_name='Mixed',
+                                                  description='Rosemary, thyme and sage')
+        Plant.objects.create(owner=cls.owner, name='Tomato', scientific_name='Solanum lycopersicum', description='Annual')
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual([plant_id for plant_id, _ in ranked_plant_ids('rosem')], [self.by_name.id, self.by_description.id])
+
+    def test_pages_cross_tied_ranks_without_gaps_or_repeats(self):
+        named = [Plant.objects.create(owner=self.owner, name='Lavender', scientific_name='Lavandula',
+                                      description='Fragrant') for _ in range(5)]
+        mentioned = [Plant.objects.create(owner=self.owner, name='Border', scientific_name='Mixed',
+                                          description='Lavender edging') for _ in range(2)]
+        ranks = [rank for _, rank in ranked_plant_ids('lavender')]
+        self.assertEqual(len(set(ranks[:5])), 1)
+
+        seen, cursor = [], None
+        while True:
+            page = search_page('lavender', cursor, per_page=3)
+            seen.extend(plant.id for plant in page)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        # Best rank first, ties newest first
+        expected = sorted((plant.id for plant in named), reverse=True) + sorted((plant.id for plant in mentioned), reverse=True)
+        self.assertEqual(seen, expected)
+
+    @skipUnless(connection.vendor == 'postgresql', 'Seeks on ts_rank, which only PostgreSQL has')
+    def test_seeking_from_a_tied_postgres_rank_keeps_the_rest_of_the_tie(self):
+        for _ in range(3):
+            Plant.objects.create(owner=self.owner, name='Lavender', scientific_name='Lavandula', description='Fragrant')
+        (first_id, rank), *rest = ranked_plant_ids('lavender')
+        # The cursor's rank must compare equal to the tied rows' ts_rank
+        self.assertEqual(len(rest), 2)
+        self.assertEqual(ranked_plant_ids('lavender', after=(rank, first_id)), rest)
+        page = search_page('lavender', pack([rank, first_id]), per_page=2)
+        self.assertEqual([plant.id for plant in page], [plant_id for plant_id, _ in rest])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SuggestIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner')
+        cls.basil = Plant.objects.create(owner=cls.owner, name='Basil', scientific_name='Ocimum basilicum')
+
+    def setUp(self):
+        cache.clear()
+
+    def names(self, index, query):
+        return [result['name'] for result in index.suggest(query)]
+
+    def test_workers_converge_after_changes(self):
+        workers = [PrefixIndex(sync_interval=0), PrefixIndex(sync_interval=0)]
+        for index in workers:
+            index.build()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            thyme = Plant.objects.create(owner=self.owner, name='Thyme', scientific_name='Thymus vulgaris')
+            workers[0].plants_changed(plants=[thyme])
+        with self.captureOnCommitCallbacks(execute=True):
+            basil_id = self.basil.pk
+            self.basil.delete()
+            workers[1].plants_changed(deleted_ids=[basil_id])
+
+        for index in workers:
+            self.assertEqual(self.names(index, 'thym'), ['Thyme'])
+            self.assertEqual(self.names(index, 'basil'), [])
+            self.assertEqual(index._version, cache.get(VERSION_KEY))
+
+    def test_concurrent_publishes_get_versions_of_their_own(self):
+        versions = []
+        lock = threading.Lock()
+
+        def publish(plant_id):
+            version = _publish([plant_id])
+            with lock:
+                versions.append(version)
+
+        threads = [threading.Thread(target=publish, args=(plant_id,)) for plant_id in range(1, 9)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(versions), list(range(1, 9)))
+        self.assertEqual(sorted(cache.get(CHANGE_KEY.format(version))[0] for version in versions), list(range(1, 9)))
+
+    def test_waits_for_a_change_still_being_written(self):
+        index = PrefixIndex(sync_interval=0)
+        index.build()
+        # Another worker has taken version 1 but not yet stored its ids
+        cache.add(VERSION_KEY, 0, None)
+        pending = cache.incr(VERSION_KEY)
+        thyme = Plant.objects.create(owner=self.owner, name='Thyme', scientific_name='Thymus vulgaris')
+        sage = Plant.objects.create(owner=self.owner, name='Sage', scientific_name='Salvia officinalis')
+        _publish([sage.pk])
+
+        with patch.object(index, 'build', wraps=index.build) as build:
+            self.assertEqual(self.names(index, 'sage'), [])
+            cache.set(CHANGE_KEY.format(pending), [thyme.pk])
+            self.assertEqual(self.names(index, 'sage'), ['Sage'])
+            self.assertEqual(self.names(index, 'thym'), ['Thyme'])
+        build.assert_not_called()
+
+    def test_rebuilds_when_a_change_never_arrives(self):
+        index = PrefixIndex(sync_interval=0)
+        index.build()
+        cache.add(VERSION_KEY, 0, None)
+        cache.incr(VERSION_KEY)
+        sage = Plant.objects.create(owner=self.owner, name='Sage', scientific_name='Salvia officinalis')
+
+        with patch('main.suggest.CHANGE_WRITE_GRACE', -1):
+            self.assertEqual(self.names(index, 'sage'), [])
+            self.assertEqual(self.names(index, 'sage'), ['Sage'])
+        self.assertEqual(index._version, 1)
@@ -11,9 +11,13 @@ urlpatterns = [
     path('upload/', views.upload_plant, name='upload_plant'),
     path('upload-plant/', views.upload_plant, name='upload_plant'),
     path('search-plants/', views.search_plants, name='search_plants'),
+    path('search-plants/suggest/', views.suggest_plants, name='suggest_plants'),
     path('search-plants-api/', views.search_plants_api, name='search_plants_api'),
+    path('health/', views.health, name='health'),
     path('search-permapeople/', views.permapeople_search, name='permapeople_search'),
+    path('search-permapeople/stream/', views.permapeople_search_stream, name='permapeople_search_stream'),
     path('plant/<int:plant_id>/', views.plant_detail, name='plant_detail'),
+    path('plant/<int:plant_id>/tab/<str:tab>/', views.plant_tab, name='plant_tab'),
     path('plant/<int:plant_id>/edit/', views.edit_plant, name='edit_plant'),
     path('plant/<int:plant_id>/delete/', views.delete_plant, name='delete_plant'),
     path('plant/<int:plant_id>/add-observation/', views.add_observation, name='add_observation'),
@@ -1,11 +1,17 @@
 import requests
 from django.conf import settings
 from django.core.cache import cache
+from django.utils import timezone
 import logging
 import os
 from dotenv import load_dotenv
 import json
-from bs4 import BeautifulSoup
+import hashlib
+import time
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .http_client import http_session
+from .singleflight import single_flight
 
 # Load environment variables
 load_dotenv()
@@ -13,7 +19,80 @@ load_dotenv()
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Bounded pool for the per-result lookups made by PermaPeopleAPI.iter_search
+lookup_executor = ThreadPoolExecutor(
+    max_workers=settings.PERMAPEOPLE_MAX_WORKERS,
+    thread_name_prefix='permapeople'
+)
+
+class WikipediaImageResolver:
+    """Resolves a plant's scientific name to the lead image of its Wikipedia article.
+
+    Uses the REST page summary endpoint, a small JSON document, instead of
+    downloading and parsing the whole article. Results are cached, including
+    names without an image, so popular species make no Wikipedia requests.
+    """
+    summary_url = 'https://en.wikipedia.org/api/rest_v1/page/summary/{title}'
+
+    # Cached for names that have no article or no image
+    NO_IMAGE = ''
+
+    def _normalize(self, scientific_name):
+        return ' '.join(scientific_name.split())
+
+    def _cache_key(self, scientific_name):
+        digest = hashlib.md5(self._normalize(scientific_name).lower().encode()).hexdigest()
+        return f"wikipedia_image_{digest}"
+
+    def get_image(self, scientific_name):
+        """Get the image URL for a scientific name, or None if there is none"""
+        if not scientific_name:
+            return None
+
+        key = self._cache_key(scientific_name)
+        cached = cache.get(key)
+        if cached is not None:
+            logger.info(f"Cache hit for Wikipedia image: {scientific_name}")
+            return cached or None
+
+        title = quote(self._normalize(scientific_name).replace(' ', '_'), safe='')
+        url = self.summary_url.format(title=title)
+        logger.info(f"Fetching Wikipedia summary: {url}")
+
+        try:
+            response = http_session.get(url)
+        except requests.exceptions.RequestException as e:
+            # Transient failures are not cached
+            logger.error(f"Error getting Wikipedia image: {str(e)}")
+            return None
+
+        image_url = None
+        if response.status_code == 200:
+            data = response.json()
+            if data.get('type') != 'disambiguation':
+                image = data.get('thumbnail') or data.get('originalimage') or {}
+                image_url = image.get('source')
+        elif response.status_code != 404:
+            logger.error(f"Failed to fetch Wikipedia summary: {response.status_code}")
+            return None
+
+        if image_url:
+            logger.info(f"Found Wikipedia image: {image_url}")
+            cache.set(key, image_url, settings.WIKIPEDIA_IMAGE_CACHE_TTL)
+        else:
+            logger.warning(f"No suitable image found for {scientific_name}")
+            cache.set(key, self.NO_IMAGE, settings.WIKIPEDIA_NO_IMAGE_CACHE_TTL)
+        return image_url
+
+
+# Shared by every API client that shows Wikipedia images
+wikipedia_images = WikipediaImageResolver()
+
 class TrefleAPI:
+    TOKEN_STATE_KEY = 'trefle_token_state'
+    # Cached in place of a 404 response, since the cache cannot store None
+    NOT_FOUND = '__not_found__'
+
     def __init__(self):
         self.base_url = 'https://trefle.io/api/v1'
         self.token = os.getenv('TREFLE_TOKEN')
@@ -28,32 +107,59 @@ class TrefleAPI:
         }
         logger.info(f"Initialized TrefleAPI with base URL: {self.base_url}")
 
-    def _make_request(self, endpoint, params=None):
-        """Make a request to the Trefle API with caching"""
+    @staticmethod
+    def _normalize_params(params):
+        """Drop empty values and collapse case and whitespace in text values"""
+        normalized = {}
+        for name, value in (params or {}).items():
+            if value is None or name == 'token':
+                continue
+            if isinstance(value, str):
+                value = ' '.join(value.split()).lower()
+            normalized[name] = value
+        return normalized
+
+    def _cache_key(self, endpoint, params):
+        """Fixed-length key for an endpoint and normalized params; never includes the token"""
+        canonical = json.dumps([endpoint.strip('/'), params], sort_keys=True, separators=(',', ':'), default=str)
+        return f"trefle_response:{hashlib.sha256(canonical.encode()).hexdigest()}"
+
+    def _make_request(self, endpoint, params=None, use_cache=True):
+        """Make a request to the Trefle API with caching.
+
+        Returns None, also from the cache, when Trefle answers 404. Concurrent
+        misses for the same key share one upstream request.
+        """
+        params = self._normalize_params(params)
+        if not use_cache:
+            response = self._fetch(endpoint, params)
+            return None if response == self.NOT_FOUND else response
+
+        cache_key = self._cache_key(endpoint, params)
+
+        def lookup():
+            return cache.get(cache_key, version=settings.TREFLE_CACHE_VERSION)
+
+        # Try to get from cache first
+        cached_response = lookup()
+        if cached_response is not None:
+            logger.info(f"Cache hit for endpoint: {endpoint}")
+        else:
+            logger.info(f"Cache miss for endpoint: {endpoint}, making API request")
+            cached_response = single_flight.do(
+                cache_key, lambda: self._fetch(endpoint, params, cache_key), lookup
+            )
+        return None if cached_response == self.NOT_FOUND else cached_response
+
+    def _fetch(self, endpoint, params, cache_key=None):
+        """Request an endpoint, caching the response under cache_key if given; a 404 returns NOT_FOUND"""
         url = f"{self.base_url}/{endpoint}"
-        cache_key = f"trefle_{endpoint}_{str(params)}"
-        
-        # Initialize params if None
-        if params is None:
-            params = {}
-        
-        # Add token to params
-        params['token'] = self.token
-        
         logger.info(f"Making request to Trefle API: {url}")
         logger.debug(f"Request parameters: {params}")
-        
-        # Try to get from cache first
-        cached_response = cache.get(cache_key)
-        if cached_response:
-            logger.info(f"Cache hit for endpoint: {endpoint}")
-            return cached_response
 
-        logger.info(f"Cache miss for endpoint: {endpoint}, making API request")
-        
         try:
             # Make the API request
-            response = requests.get(url, params=params)
+            response = http_session.get(url, params={**params, 'token': self.token})
             
             # Log response details for debugging
             logger.debug(f"Response status code: {response.status_code}")
@@ -63,17 +169,32 @@ class TrefleAPI:
             # Check for authentication error
             if response.status_code == 401:
                 logger.error("Authentication failed. Token may be invalid or expired.")
+                self._set_token_state(False, 'Trefle rejected the API token (401)')
                 raise requests.exceptions.RequestException("Authentication failed. Please check your API token.")
+
+            if response.status_code == 404:
+                logger.info(f"Trefle has no resource at {endpoint}")
+                if cache_key:
+                    cache.set(cache_key, self.NOT_FOUND, settings.TREFLE_NEGATIVE_CACHE_TTL,
+                              version=settings.TREFLE_CACHE_VERSION)
+                return self.NOT_FOUND
             
             response.raise_for_status()
             
             data = response.json()
             logger.info(f"Successfully received response from {endpoint}")
             logger.debug(f"Response data: {data}")
+
+            # Any authenticated response proves the token works
+            if self.token_valid() is not True:
+                self._set_token_state(True)
             
-            # Cache the response for 1 hour
-            cache.set(cache_key, data, 3600)
-            logger.info(f"Cached response for endpoint: {endpoint}")
+            if cache_key:
+                # Searches without hits are kept for the shorter negative TTL
+                empty = isinstance(data, dict) and data.get('data') == []
+                timeout = settings.TREFLE_NEGATIVE_CACHE_TTL if empty else settings.TREFLE_CACHE_TTL
+                cache.set(cache_key, data, timeout, version=settings.TREFLE_CACHE_VERSION)
+                logger.info(f"Cached response for endpoint: {endpoint}")
             
             return data
         except requests.exceptions.RequestException as e:
@@ -82,21 +203,60 @@ class TrefleAPI:
                 logger.error(f"Response text: {e.response.text}")
             raise
 
-    def check_authentication(self):
-        """Check if the API token is valid"""
+    def token_state(self):
+        """Return the cached token check as a dict, or None if it is unknown or due for a re-check"""
+        return cache.get(self.TOKEN_STATE_KEY)
+
+    def token_valid(self):
+        """True or False from the last token check, None if the token has not been checked recently"""
+        state = self.token_state()
+        return state['valid'] if state else None
+
+    def _set_token_state(self, valid, error=''):
+        state = {'valid': valid, 'checked_at': timezone.now().isoformat(), 'error': error}
+        # An invalid token, or an unreachable Trefle, is re-checked sooner so a fix is picked up quickly
+        timeout = settings.TREFLE_TOKEN_CHECK_INTERVAL if valid else settings.TREFLE_TOKEN_RECHECK_INTERVAL
+        cache.set(self.TOKEN_STATE_KEY, state, timeout)
+        return state
+
+    def check_authentication(self, force=False):
+        """Check if the API token is valid.
+
+        The result is cached for TREFLE_TOKEN_CHECK_INTERVAL seconds, and is
+        also updated whenever a regular request succeeds or gets a 401, so the
+        probe request only goes out when nothing else has proven the token.
+        """
+        state = None if force else self.token_state()
+        if state is not None:
+            return state['valid']
+
         try:
-            # Try to make a simple request to check authentication
-            # Using a simpler endpoint that doesn't require complex parameters
-            response = self._make_request('kingdoms', {'page': 1})
+            self._make_request('kingdoms', {'page': 1}, use_cache=False)
             return True
         except requests.exceptions.RequestException as e:
             logger.error(f"Authentication check failed: {str(e)}")
+            if self.token_valid() is None:
+                # Trefle could not be reached, which says nothing about the token;
+                # remember that too, so callers do not retry the probe every time
+                self._set_token_state(None, 'Trefle API is unreachable')
+                return None
             return False
 
+    def health(self):
+        """Token status for the health endpoint, from the cached check only; never calls Trefle"""
+        state = self.token_state() or {}
+        return {
+            'configured': True,
+            'token_valid': state.get('valid'),
+            'checked_at': state.get('checked_at'),
+            'error': state.get('error', ''),
+        }
+
     def search_plants(self, query, page=1, per_page=20):
         """Search for plants"""
-        # Check authentication before searching
-        if not self.check_authentication():
+        # Fail fast if the token is already known to be bad; otherwise the
+        # search itself tells us whether it still works
+        if self.token_valid() is False:
             raise requests.exceptions.RequestException("API authentication failed. Please check your API token.")
             
         params = {
@@ -110,13 +270,13 @@ class TrefleAPI:
         """Get detailed information about a specific plant"""
         try:
             logger.info(f"Fetching plant details for ID: {plant_id}")
-            endpoint = f'plant/{plant_id}'
-            response = self._make_request(endpoint, 'GET')
+            endpoint = f'plants/{plant_id}'
+            response = self._make_request(endpoint)
             
             logger.debug(f"Raw API response for plant {plant_id}: {response}")
             
             if not response:
-                logger.error(f"Empty response for plant {plant_id}")
+                logger.warning(f"No Trefle plant found for ID: {plant_id}")
                 return None
                 
             # Ensure we have the expected data structure
@@ -160,63 +320,6 @@ class TrefleAPI:
         params = {'page': page}
         return self._make_request('subkingdoms', params)
 
-    def _get_wikipedia_image(self, scientific_name):
-        """Get the first image from a Wikipedia page for a plant"""
-        try:
-            # Format the scientific name for the Wikipedia URL
-            formatted_name = scientific_name.replace(' ', '_')
-            url = f'https://en.wikipedia.org/wiki/{formatted_name}'
-            
-            self.logger.info(f"Fetching Wikipedia page: {url}")
-            
-            # Make a request to the Wikipedia page
-            response = requests.get(url)
-            if response.status_code != 200:
-                self.logger.error(f"Failed to fetch Wikipedia page: {response.status_code}")
-                return None
-                
-            # Parse the HTML content
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Try to find the first image in the article
-            # First, look for the infobox image
-            infobox = soup.find('table', class_='infobox')
-            if infobox:
-                img = infobox.find('img')
-                if img and img.get('src'):
-                    # Convert relative URL to absolute
-                    img_url = img.get('src')
-                    if img_url.startswith('//'):
-                        img_url = 'https:' + img_url
-                    elif img_url.startswith('/'):
-                        img_url = 'https://en.wikipedia.org' + img_url
-                    self.logger.info(f"Found infobox image: {img_url}")
-                    return img_url
-            
-            # If no infobox image, look for the first image in the article
-            article = soup.find('div', class_='mw-parser-output')
-            if article:
-                for img in article.find_all('img'):
-                    # Skip small icons and thumbnails
-                    if img.get('width') and int(img.get('width', '0')) < 100:
-                        continue
-                    if img.get('src'):
-                        # Convert relative URL to absolute
-                        img_url = img.get('src')
-                        if img_url.startswith('//'):
-                            img_url = 'https:' + img_url
-                        elif img_url.startswith('/'):
-                            img_url = 'https://en.wikipedia.org' + img_url
-                        self.logger.info(f"Found article image: {img_url}")
-                        return img_url
-            
-            self.logger.warning(f"No suitable image found for {scientific_name}")
-            return None
-            
-        except Exception as e:
-            self.logger.error(f"Error getting Wikipedia image: {str(e)}")
-            return None
-
 class PermaPeopleAPI:
     def __init__(self):
         self.base_url = 'https://permapeople.org/api'
@@ -233,63 +336,6 @@ class PermaPeopleAPI:
         }
         self.logger = logging.getLogger(__name__)
 
-    def _get_wikipedia_image(self, scientific_name):
-        """Get the first image from a Wikipedia page for a plant"""
-        try:
-            # Format the scientific name for the Wikipedia URL
-            formatted_name = scientific_name.replace(' ', '_')
-            url = f'https://en.wikipedia.org/wiki/{formatted_name}'
-            
-            self.logger.info(f"Fetching Wikipedia page: {url}")
-            
-            # Make a request to the Wikipedia page
-            response = requests.get(url)
-            if response.status_code != 200:
-                self.logger.error(f"Failed to fetch Wikipedia page: {response.status_code}")
-                return None
-                
-            # Parse the HTML content
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Try to find the first image in the article
-            # First, look for the infobox image
-            infobox = soup.find('table', class_='infobox')
-            if infobox:
-                img = infobox.find('img')
-                if img and img.get('src'):
-                    # Convert relative URL to absolute
-                    img_url = img.get('src')
-                    if img_url.startswith('//'):
-                        img_url = 'https:' + img_url
-                    elif img_url.startswith('/'):
-                        img_url = 'https://en.wikipedia.org' + img_url
-                    self.logger.info(f"Found infobox image: {img_url}")
-                    return img_url
-            
-            # If no infobox image, look for the first image in the article
-            article = soup.find('div', class_='mw-parser-output')
-            if article:
-                for img in article.find_all('img'):
-                    # Skip small icons and thumbnails
-                    if img.get('width') and int(img.get('width', '0')) < 100:
-                        continue
-                    if img.get('src'):
-                        # Convert relative URL to absolute
-                        img_url = img.get('src')
-                        if img_url.startswith('//'):
-                            img_url = 'https:' + img_url
-                        elif img_url.startswith('/'):
-                            img_url = 'https://en.wikipedia.org' + img_url
-                        self.logger.info(f"Found article image: {img_url}")
-                        return img_url
-            
-            self.logger.warning(f"No suitable image found for {scientific_name}")
-            return None
-            
-        except Exception as e:
-            self.logger.error(f"Error getting Wikipedia image: {str(e)}")
-            return None
-
     def _make_request(self, method, endpoint, params=None, data=None):
         """Make an HTTP request to the PermaPeople API with detailed logging."""
         url = f"{self.base_url}/{endpoint}"
@@ -300,7 +346,7 @@ class PermaPeopleAPI:
             self.logger.info(f"Request data: {data}")
 
         try:
-            response = requests.request(
+            response = http_session.request(
                 method=method,
                 url=url,
                 headers=self.headers,
@@ -319,108 +365,228 @@ class PermaPeopleAPI:
                 self.logger.error(f"Error response: {e.response.text}")
             raise
 
-    def search_plants(self, query):
-        """Search for plants using the PermaPeople API"""
+    def _search_cache_key(self, query):
+        digest = hashlib.sha256(query.lower().encode()).hexdigest()
+        return f"permapeople_search:{digest}"
+
+    def _normalize_query(self, query):
+        return ' '.join(str(query).split())
+
+    def cached_search(self, query):
+        """Return the cached results for a query, or None if it has to be searched"""
+        return cache.get(self._search_cache_key(self._normalize_query(query)))
+
+    def iter_search(self, query, deadline=None):
+        """Yield search results as soon as each one's details have been fetched.
+
+        Results come in completion order rather than ranking order; cached
+        results are yielded straight away. Concurrent searches for the same
+        query share one search: the first streams it, the others wait for it
+        and then yield the cached results. Nothing waits or fetches past
+        ``deadline`` (a time.monotonic() value), PERMAPEOPLE_SEARCH_TIMEOUT
+        seconds from now by default.
+        """
+        if deadline is None:
+            deadline = time.monotonic() + settings.PERMAPEOPLE_SEARCH_TIMEOUT
+        query = self._normalize_query(query)
+        key = self._search_cache_key(query)
+
+        def lookup():
+            return cache.get(key)
+
+        results = lookup()
+        if results is not None:
+            self.logger.info(f"Search cache hit for query: {query}")
+            yield from results
+            return
+
+        def iterate():
+            for _, plant_data in self._iter_search(query, key, deadline):
+                yield plant_data
+
+        yield from single_flight.stream(key, iterate, lookup, wait_timeout=max(deadline - time.monotonic(), 0))
+
+    def _iter_search(self, query, cache_key, deadline):
+        """Yield (rank, result) pairs as details resolve, caching the results unless they are partial"""
         try:
-            self.logger.info(f"Searching plants with query: {query}")
-            response = self._make_request('POST', 'search', data={'q': query})
-            
-            self.logger.info(f"Raw API response: {response}")
-            
-            if not response:
-                self.logger.error("Empty response from search API")
-                return []
-                
-            # Extract and format the search results
-            results = []
-            
-            # Log the structure of the response
-            self.logger.info(f"Response type: {type(response)}")
-            self.logger.info(f"Response keys: {response.keys() if isinstance(response, dict) else 'Not a dict'}")
-            
-            # Try different possible response structures
-            if isinstance(response, dict):
-                if 'data' in response:
-                    plants_data = response['data']
-                elif 'plants' in response:
-                    plants_data = response['plants']
-                else:
-                    plants_data = [response]
-            elif isinstance(response, list):
-                plants_data = response
-            else:
-                self.logger.error(f"Unexpected response type: {type(response)}")
-                return []
-            
-            self.logger.info(f"Plants data type: {type(plants_data)}")
-            self.logger.info(f"Number of plants found: {len(plants_data) if isinstance(plants_data, list) else 'Not a list'}")
-            
-            for plant in plants_data:
-                self.logger.info(f"Processing plant: {plant}")
-                # Log the structure of each plant
-                self.logger.info(f"Plant keys: {plant.keys() if isinstance(plant, dict) else 'Not a dict'}")
-                
-                # Try to extract data from different possible structures
-                if isinstance(plant, dict):
-                    plant_id = plant.get('id')
-                    if not plant_id:
-                        continue
-                        
-                    # Get detailed plant information
+            plant_ids, updated_at = self.search_hits(query)
+
+            # Fetch details for every hit concurrently, keeping whatever
+            # finishes before the deadline
+            futures = {
+                lookup_executor.submit(self._get_search_result, plant_id, updated_at[plant_id]): (rank, plant_id)
+                for rank, plant_id in enumerate(plant_ids)
+            }
+            results_by_rank = {}
+            complete = True
+            try:
+                for future in as_completed(futures, timeout=max(deadline - time.monotonic(), 0)):
+                    rank, plant_id = futures[future]
                     try:
-                        detailed_plant = self._make_request('GET', f'plants/{plant_id}')
-                        self.logger.info(f"Detailed plant info: {detailed_plant}")
-                        
-                        if not detailed_plant:
-                            continue
-                            
-                        # Create a base plant object with the main fields
-                        plant_data = {
-                            'id': plant_id,
-                            'name': detailed_plant.get('name'),
-                            'scientific_name': detailed_plant.get('scientific_name'),
-                            'description': detailed_plant.get('description', ''),
-                            'image_url': detailed_plant.get('image_url', ''),
-                            'link': detailed_plant.get('link', ''),
-                            'slug': detailed_plant.get('slug', ''),
-                            'data': detailed_plant.get('data', [])
-                        }
-                        
-                        # Check if there's a Wikipedia link in the data
-                        wikipedia_url = None
-                        for item in plant_data['data']:
-                            if item.get('key', '').lower() == 'wikipedia':
-                                wikipedia_url = item.get('value', '')
-                                break
-                        
-                        # If there's a Wikipedia link, try to get the first image
-                        if wikipedia_url and plant_data['scientific_name']:
-                            try:
-                                wikipedia_image = self._get_wikipedia_image(plant_data['scientific_name'])
-                                if wikipedia_image:
-                                    plant_data['wikipedia_image'] = wikipedia_image
-                            except Exception as e:
-                                self.logger.error(f"Error fetching Wikipedia image: {str(e)}")
-                        
-                        results.append(plant_data)
-                        
+                        plant_data = future.result()
                     except Exception as e:
                         self.logger.error(f"Error fetching details for plant {plant_id}: {str(e)}")
+                        complete = False
                         continue
-            
-            self.logger.info(f"Processed {len(results)} plants")
-            return results
+                    if plant_data:
+                        results_by_rank[rank] = plant_data
+                        yield rank, plant_data
+            except TimeoutError:
+                complete = False
+                pending = sum(1 for future in futures if not future.done())
+                self.logger.warning(
+                    f"Timed out fetching details for {pending} of {len(futures)} plants, "
+                    f"returning partial results"
+                )
+            finally:
+                # Also reached when a streaming client goes away mid-search
+                for future in futures:
+                    future.cancel()
+
+            self.logger.info(f"Processed {len(results_by_rank)} plants")
+            if complete:
+                results = [results_by_rank[rank] for rank in sorted(results_by_rank)]
+                cache.set(cache_key, results, settings.PERMAPEOPLE_SEARCH_CACHE_TTL)
             
         except Exception as e:
             self.logger.error(f"Error searching plants: {str(e)}")
             self.logger.exception("Full traceback:")
-            return []
+
+    def search_hits(self, query):
+        """Run the search request and return the hit IDs in ranking order with their updated_at"""
+        self.logger.info(f"Searching plants with query: {query}")
+        response = self._make_request('POST', 'search', data={'q': query})
+        
+        self.logger.info(f"Raw API response: {response}")
+        
+        if not response:
+            self.logger.error("Empty response from search API")
+            return [], {}
+            
+        # Log the structure of the response
+        self.logger.info(f"Response type: {type(response)}")
+        self.logger.info(f"Response keys: {response.keys() if isinstance(response, dict) else 'Not a dict'}")
+        
+        # Try different possible response structures
+        if isinstance(response, dict):
+            if 'data' in response:
+                plants_data = response['data']
+            elif 'plants' in response:
+                plants_data = response['plants']
+            else:
+                plants_data = [response]
+        elif isinstance(response, list):
+            plants_data = response
+        else:
+            self.logger.error(f"Unexpected response type: {type(response)}")
+            return [], {}
+        
+        self.logger.info(f"Plants data type: {type(plants_data)}")
+        self.logger.info(f"Number of plants found: {len(plants_data) if isinstance(plants_data, list) else 'Not a list'}")
+        
+        plant_ids = []
+        updated_at = {}
+        for plant in plants_data:
+            # Log the structure of each plant
+            self.logger.info(f"Plant keys: {plant.keys() if isinstance(plant, dict) else 'Not a dict'}")
+            if isinstance(plant, dict) and plant.get('id') and plant['id'] not in plant_ids:
+                plant_ids.append(plant['id'])
+                updated_at[plant['id']] = plant.get('updated_at')
+        return plant_ids, updated_at
     
+    def _plant_cache_key(self, plant_id):
+        return f"permapeople_plant_{plant_id}"
+
+    def _fetch_plant_record(self, plant_id):
+        """Fetch a plant record from the API and store it in the cache"""
+        record = self._make_request('GET', f'plants/{plant_id}')
+        if record:
+            entry = {'record': record, 'fetched_at': time.time()}
+            timeout = settings.PERMAPEOPLE_CACHE_TTL + settings.PERMAPEOPLE_CACHE_STALE_TTL
+            cache.set(self._plant_cache_key(plant_id), entry, timeout)
+        return record
+
+    def _refresh_plant_record(self, plant_id):
+        try:
+            self._fetch_plant_record(plant_id)
+            self.logger.info(f"Refreshed cached PermaPeople plant {plant_id}")
+        except Exception as e:
+            self.logger.error(f"Error refreshing cached PermaPeople plant {plant_id}: {str(e)}")
+        finally:
+            cache.delete(f"{self._plant_cache_key(plant_id)}_refreshing")
+
+    def get_plant_record(self, plant_id, updated_at=None):
+        """Get the raw plants/{id} record through a read-through cache.
+
+        Records younger than PERMAPEOPLE_CACHE_TTL are served from the cache.
+        Older ones are still served for up to PERMAPEOPLE_CACHE_STALE_TTL while
+        a background refresh runs. Passing the upstream ``updated_at`` (e.g. from
+        a search hit) refetches the record if it has changed since it was cached.
+        """
+        key = self._plant_cache_key(plant_id)
+        entry = cache.get(key)
+
+        if entry is not None:
+            record = entry['record']
+            age = time.time() - entry['fetched_at']
+            if updated_at and record.get('updated_at') != updated_at:
+                self.logger.info(f"PermaPeople plant {plant_id} changed upstream, refetching")
+            elif age < settings.PERMAPEOPLE_CACHE_TTL:
+                self.logger.info(f"Cache hit for PermaPeople plant {plant_id}")
+                return record
+            else:
+                # Serve the stale copy and refresh it once in the background
+                if cache.add(f"{key}_refreshing", True, 60):
+                    lookup_executor.submit(self._refresh_plant_record, plant_id)
+                self.logger.info(f"Serving stale PermaPeople plant {plant_id} ({age:.0f}s old)")
+                return record
+
+        self.logger.info(f"Cache miss for PermaPeople plant {plant_id}")
+        return self._fetch_plant_record(plant_id)
+
+    def _get_search_result(self, plant_id, updated_at=None):
+        """Fetch the details (and Wikipedia image) shown for one search hit"""
+        detailed_plant = self.get_plant_record(plant_id, updated_at)
+        self.logger.info(f"Detailed plant info: {detailed_plant}")
+
+        if not detailed_plant:
+            return None
+
+        # Create a base plant object with the main fields
+        plant_data = {
+            'id': plant_id,
+            'name': detailed_plant.get('name'),
+            'scientific_name': detailed_plant.get('scientific_name'),
+            'description': detailed_plant.get('description', ''),
+            'image_url': detailed_plant.get('image_url', ''),
+            'link': detailed_plant.get('link', ''),
+            'slug': detailed_plant.get('slug', ''),
+            'data': detailed_plant.get('data', [])
+        }
+
+        # Check if there's a Wikipedia link in the data
+        wikipedia_url = None
+        for item in plant_data['data']:
+            if item.get('key', '').lower() == 'wikipedia':
+                wikipedia_url = item.get('value', '')
+                break
+
+        # If there's a Wikipedia link, try to get the first image
+        if wikipedia_url and plant_data['scientific_name']:
+            try:
+                wikipedia_image = wikipedia_images.get_image(plant_data['scientific_name'])
+                if wikipedia_image:
+                    plant_data['wikipedia_image'] = wikipedia_image
+            except Exception as e:
+                self.logger.error(f"Error fetching Wikipedia image: {str(e)}")
+
+        return plant_data
+
     def get_plant(self, plant_id):
         """Get detailed information about a specific plant"""
         try:
             self.logger.info(f"Fetching plant details for ID: {plant_id}")
-            response = self._make_request('GET', f'plants/{plant_id}')
+            response = self.get_plant_record(plant_id)
             self.logger.info(f"Plant details response: {response}")
             
             if not response:
@@ -457,5 +623,7 @@ class PermaPeopleAPI:
             return None
 
 
-# Initialize the API client
-permapeople_api = PermaPeopleAPI() 
\ No newline at end of file
+# Initialize the API clients
+permapeople_api = PermaPeopleAPI()
+# Trefle is optional; views report it as unconfigured when there is no token
+trefle_api = TrefleAPI() if os.getenv('TREFLE_TOKEN') else None 
\ No newline at end of file
@@ -6,21 +6,29 @@ from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_protect, ensure_csrf_cookie
 from django.db import IntegrityError, transaction
 from django.core.exceptions import ValidationError
-from .models import Plant, PlantDetail, Observation, PlantPhoto, Profile, Comment, Message
+from .models import Plant, PlantDetail, Observation, PlantPhoto, Profile, Comment, Message, MODERATION_APPROVED, MODERATION_PENDING
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
+import hmac
 import json
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from urllib.parse import urlencode
 from django.views.decorators.http import require_POST
 from django.utils import timezone
-from .utils import permapeople_api
+from .utils import permapeople_api, trefle_api
+from . import search
+from .suggest import plant_suggestions
+from .ingestion import create_plant_from_permapeople, merge_permapeople_details
+from .moderation import detector_pool
+from .pagination import InvalidCursor, KeysetPaginator, paginate, page_url
+from .fragments import cached_fragment
 from django.db.models import Q
-from django.core.paginator import Paginator
-from django.db.models import Count
 from .forms import PlantForm, ObservationForm, PhotoForm, ProfileForm
 from django.urls import reverse
 import logging
-from django.core.paginator import PageNotAnInteger, EmptyPage
+from django.conf import settings
+from django.core.cache import caches
 import traceback
 
 logger = logging.getLogger(__name__)
@@ -130,29 +138,90 @@ def upload_plant(request):
         messages.error(request, 'An error occurred while uploading the plant.')
         return redirect('main:home')
 
+def comment_tree(comments):
+    """Nest comments given oldest first: returns the top-level ones newest first,
+    each with its replies, oldest first, in ``thread_replies``"""
+    by_id = {comment.id: comment for comment in comments}
+    roots = []
+    for comment in comments:
+        comment.thread_replies = []
+    for comment in comments:
+        parent = by_id.get(comment.parent_id)
+        (parent.thread_replies if parent is not None else roots).append(comment)
+    roots.reverse()
+    return roots
+
+# plant_detail tabs listed page by page; settings is static
+PLANT_TABS = ('details', 'observations', 'photos', 'comments')
+TAB_ORDERING = ('-created_at', '-id')
+
+def plant_tab_queryset(plant, tab):
+    """Items listed on one of the PLANT_TABS"""
+    if tab == 'details':
+        return PlantDetail.objects.filter(plant=plant)
+    if tab == 'observations':
+        return Observation.objects.filter(plant=plant)
+    if tab == 'photos':
+        return PlantPhoto.objects.filter(plant=plant, moderation_status=MODERATION_APPROVED)
+    # Comments are paged by thread; replies come with their top-level comment
+    return Comment.objects.filter(plant=plant, parent__isnull=True).select_related('author__profile')
+
+def with_replies(threads):
+    """Load the replies under a page of top-level comments, at any depth, in one query"""
+    comments = list(threads)
+    comments.extend(Comment.objects.filter(thread__in=comments).select_related('author__profile'))
+    return comment_tree(sorted(comments, key=lambda comment: (comment.created_at, comment.id)))
+
+def plant_tab_page(plant, tab, cursor=None):
+    """One page of a plant_detail tab: its items and the URL of the next page, if any"""
+    page = KeysetPaginator(plant_tab_queryset(plant, tab), TAB_ORDERING, settings.PLANT_TAB_PAGE_SIZE).page(cursor)
+    items = page.object_list
+    if tab == 'comments':
+        items = with_replies(items)
+    next_url = None
+    if page.has_next:
+        next_url = f"{reverse('main:plant_tab', args=[plant.id, tab])}?{urlencode({'cursor': page.next_cursor})}"
+    return items, next_url
+
+def render_plant_tab(request, plant, tab, cursor=None):
+    """A tab page's rendered items and next page URL.
+
+    Everyone but the owner, whose copy carries edit and delete controls,
+    sees the same HTML, so theirs is served from the plant's fragment cache.
+    """
+    def render():
+        items, next_url = plant_tab_page(plant, tab, cursor)
+        html = render_to_string('main/plant_tab_items.html', {'plant': plant, 'tab': tab, 'items': items}, request=request)
+        return html, next_url
+
+    if request.user == plant.owner:
+        return render()
+    return cached_fragment(plant, f"{tab}:{cursor or ''}", render)
+
 def plant_detail(request, plant_id):
     try:
         logger.info(f"Starting plant_detail view for plant {plant_id}")
-        plant = get_object_or_404(Plant, id=plant_id)
+        plant = get_object_or_404(Plant.objects.select_related('owner'), id=plant_id)
         logger.debug(f"Retrieved plant {plant_id} owned by user {plant.owner.id}")
-        details = PlantDetail.objects.filter(plant=plant).order_by('-created_at')
-        observations = Observation.objects.filter(plant=plant).order_by('-created_at')
-        photos = PlantPhoto.objects.filter(plant=plant).order_by('-created_at')
-        comments = Comment.objects.filter(plant=plant).order_by('-created_at')
+
+        # Get active tab from request or default to 'details'
+        active_tab = request.GET.get('tab', 'details')
+
+        # Only the active tab's first page is rendered; the rest load from plant_tab
+        tab_html, tab_next_url = '', None
+        if active_tab in PLANT_TABS:
+            tab_html, tab_next_url = render_plant_tab(request, plant, active_tab)
         
         # Create forms for observations and photos
         observation_form = ObservationForm()
         photo_form = PhotoForm()
         
-        # Get active tab from request or default to 'details'
-        active_tab = request.GET.get('tab', 'details')
-        
         context = {
             'plant': plant,
-            'details': details,
-            'observations': observations,
-            'photos': photos,
-            'comments': comments,
+            'fragment_cache_ttl': settings.PLANT_FRAGMENT_CACHE_TTL,
+            'tab_html': tab_html,
+            'tab_empty': not tab_html.strip(),
+            'tab_next_url': tab_next_url,
             'observation_form': observation_form,
             'photo_form': photo_form,
             'active_tab': active_tab,
@@ -164,6 +233,17 @@ def plant_detail(request, plant_id):
         messages.error(request, 'An error occurred while loading the plant details.')
         return redirect('main:home')
 
+def plant_tab(request, plant_id, tab):
+    """A page of one plant_detail tab as rendered HTML, fetched when the tab is opened"""
+    plant = get_object_or_404(Plant.objects.select_related('owner'), id=plant_id)
+    if tab not in PLANT_TABS:
+        return JsonResponse({'error': f'Unknown tab: {tab}'}, status=404)
+    try:
+        html, next_url = render_plant_tab(request, plant, tab, request.GET.get('cursor'))
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    return JsonResponse({'html': html, 'next_url': next_url})
+
 @login_required
 def add_observation(request, plant_id):
     try:
@@ -175,8 +255,12 @@ def add_observation(request, plant_id):
                 observation = form.save(commit=False)
                 observation.plant = plant
                 observation.save()
+                form.queue_moderation()
                 logger.info(f"Successfully added observation {observation.id} for plant {plant_id}")
-                messages.success(request, 'Observation added successfully!')
+                if observation.moderation_status == MODERATION_PENDING:
+                    messages.success(request, 'Observation added! Its image will appear once it passes moderation.')
+                else:
+                    messages.success(request, 'Observation added successfully!')
                 return redirect('main:plant_detail', plant_id)
             else:
                 logger.warning(f"Invalid observation form submission for plant {plant_id}: {form.errors}")
@@ -200,8 +284,12 @@ def add_photo(request, plant_id):
                 photo = form.save(commit=False)
                 photo.plant = plant
                 photo.save()
+                form.queue_moderation()
                 logger.info(f"Successfully added photo {photo.id} for plant {plant_id}")
-                messages.success(request, 'Photo added successfully!')
+                if photo.moderation_status == MODERATION_PENDING:
+                    messages.success(request, 'Photo uploaded! It will appear once it passes moderation.')
+                else:
+                    messages.success(request, 'Photo added successfully!')
                 return redirect('main:plant_detail', plant_id)
             else:
                 logger.warning(f"Invalid photo form submission for plant {plant_id}: {form.errors}")
@@ -222,21 +310,21 @@ def profile(request):
         if request.method == 'POST':
             form = ProfileForm(request.POST, request.FILES, instance=request.user.profile)
             if form.is_valid():
-                form.save()
+                profile = form.save()
                 logger.info(f"Successfully updated profile for user {request.user.id}")
-                messages.success(request, 'Profile updated successfully!')
+                if profile.moderation_status == MODERATION_PENDING:
+                    messages.success(request, 'Profile updated! Your new photo will appear once it passes moderation.')
+                else:
+                    messages.success(request, 'Profile updated successfully!')
                 return redirect('main:profile')
             else:
                 logger.warning(f"Invalid profile form submission for user {request.user.id}: {form.errors}")
         else:
             form = ProfileForm(instance=request.user.profile)
         
-        plants_count = Plant.objects.filter(owner=request.user).count()
-        logger.debug(f"Retrieved {plants_count} plants for user {request.user.id}")
-        
         return render(request, 'main/profile.html', {
             'form': form,
-            'plants_count': plants_count
+            'plants_count': request.user.profile.plant_count
         })
     except Exception as e:
         logger.error(f"Error in profile view: {str(e)}", exc_info=True)
@@ -259,7 +347,7 @@ def add_comment(request, plant_id):
         if content:
             Comment.objects.create(
                 plant=plant,
-                user=request.user,
+                author=request.user,
                 content=content
             )
             messages.success(request, 'Comment added successfully!')
@@ -271,8 +359,8 @@ def add_comment(request, plant_id):
 @login_required
 @csrf_protect
 def delete_comment(request, plant_id, comment_id):
-    comment = get_object_or_404(Comment, id=comment_id, plant__id=plant_id)
-    if request.user == comment.plant.user:
+    comment = get_object_or_404(Comment.objects.select_related('plant'), id=comment_id, plant__id=plant_id)
+    if request.user == comment.plant.owner:
         comment.delete()
         messages.success(request, 'Comment deleted successfully!')
     else:
@@ -282,27 +370,50 @@ def delete_comment(request, plant_id, comment_id):
 def search_plants_api(request):
     """API endpoint for plant search"""
     query = request.GET.get('q', '')
+    if trefle_api is None:
+        return JsonResponse({'error': 'Trefle search is not configured'}, status=503)
     try:
         results = trefle_api.search_plants(query, per_page=10)
-        return JsonResponse(results)
+        return JsonResponse(results or {'data': []})
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+def health_check_allowed(request):
+    """Staff, or a monitor sending ``Authorization: Bearer <HEALTH_CHECK_TOKEN>``"""
+    if request.user.is_staff:
+        return True
+    token = settings.HEALTH_CHECK_TOKEN
+    return bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+def health(request):
+    """Status of the external integrations, for uptime checks and debugging.
+
+    Reports only state that is already cached, so it never makes upstream calls.
+    """
+    if not health_check_allowed(request):
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+    trefle = trefle_api.health() if trefle_api else {'configured': False, 'token_valid': None}
+    status = {
+        'trefle': trefle,
+        'moderation': detector_pool.stats(),
+        'caches': {alias: caches[alias].stats() for alias in settings.CACHES if hasattr(caches[alias], 'stats')},
+    }
+    return JsonResponse(status)
+
 def search_plants(request):
     try:
         logger.info("Starting search_plants view")
         query = request.GET.get('q', '')
+        cursor = request.GET.get('cursor')
         if query:
-            plants = Plant.objects.filter(
-                Q(name__icontains=query) |
-                Q(scientific_name__icontains=query)
-            ).select_related('owner')
-            logger.debug(f"Found {plants.count()} plants matching query: {query}")
+            plants = search.search_page(query, cursor)
+            plants.next_url = page_url(request, plants.next_cursor)
+            logger.debug(f"Found {len(plants)} plants matching query: {query}")
             
             # If no local plants found, redirect to PermaPeople search
-            if not plants.exists():
+            if not plants and not cursor:
                 logger.info(f"No local plants found for query '{query}', redirecting to PermaPeople search")
-                return redirect(f"{reverse('main:permapeople_search')}?q={query}")
+                return redirect(f"{reverse('main:permapeople_search')}?{urlencode({'q': query})}")
         else:
             plants = []
             logger.debug("No search query provided")
@@ -317,37 +428,38 @@ def search_plants(request):
         messages.error(request, 'An error occurred while searching for plants.')
         return redirect('main:home')
 
+def suggest_plants(request):
+    """Typeahead suggestions for the search boxes, served from the in-memory prefix index"""
+    query = request.GET.get('q', '')
+    suggestions = plant_suggestions.suggest(query)
+    for suggestion in suggestions:
+        suggestion['url'] = reverse('main:plant_detail', args=[suggestion['id']])
+    return JsonResponse({'query': query, 'suggestions': suggestions})
+
 def directory(request):
     try:
         logger.info("Starting directory view")
         search_query = request.GET.get('q', '')
         per_page = int(request.GET.get('per_page', 12))
-        page = request.GET.get('page', 1)
 
-        # Get all users with their plant counts and prefetch profiles
-        users = User.objects.select_related('profile').annotate(plant_count=Count('plant')).order_by('-plant_count')
-        logger.debug(f"Retrieved {users.count()} users for directory")
+        # Users with the most plants first, paged along the profile plant_count
+        # index; a user without a profile is not listed
+        profiles = Profile.objects.select_related('user')
 
         # Apply search filter if query exists
         if search_query:
-            users = users.filter(
-                Q(first_name__icontains=search_query) |
-                Q(last_name__icontains=search_query) |
-                Q(email__icontains=search_query)
+            profiles = profiles.filter(
+                Q(user__first_name__icontains=search_query) |
+                Q(user__last_name__icontains=search_query) |
+                Q(user__email__icontains=search_query)
             )
             logger.debug(f"Applied search filter: {search_query}")
 
-        # Paginate results
-        paginator = Paginator(users, per_page)
-        try:
-            users = paginator.get_page(page)
-            logger.debug(f"Retrieved page {page} of {paginator.num_pages}")
-        except (PageNotAnInteger, EmptyPage):
-            users = paginator.get_page(1)
-            logger.warning(f"Invalid page number {page}, defaulting to page 1")
+        profiles = paginate(request, profiles, ('-plant_count', 'user_id'), per_page)
+        logger.debug(f"Retrieved {len(profiles)} users")
 
         context = {
-            'users': users,
+            'profiles': profiles,
             'search_query': search_query,
         }
         return render(request, 'main/directory.html', context)
@@ -357,12 +469,15 @@ def directory(request):
         messages.error(request, 'An error occurred while loading the directory.')
         return redirect('main:home')
 
+# Plant lists on my_plants and user_profile, newest first
+PLANT_LIST_ORDERING = ('-created_at', '-id')
+
 @login_required
 def my_plants(request):
     try:
         logger.info(f"Starting my_plants view for user {request.user.id}")
-        plants = Plant.objects.filter(owner=request.user).order_by('-created_at')
-        logger.debug(f"Retrieved {plants.count()} plants for user {request.user.id}")
+        plants = paginate(request, Plant.objects.filter(owner=request.user), PLANT_LIST_ORDERING, settings.PLANTS_PER_PAGE)
+        logger.debug(f"Retrieved {len(plants)} plants for user {request.user.id}")
         return render(request, 'main/my_plants.html', {'plants': plants})
     except Exception as e:
         logger.error(f"Error in my_plants view: {str(e)}", exc_info=True)
@@ -373,9 +488,8 @@ def my_plants(request):
 def user_profile(request, user_id):
     try:
         logger.info(f"Starting user_profile view for user {user_id}")
-        profile_user = get_object_or_404(User, id=user_id)
-        plants = Plant.objects.filter(owner=profile_user)
-        logger.debug(f"Retrieved {plants.count()} plants for user {user_id}")
+        profile_user = get_object_or_404(User.objects.select_related('profile'), id=user_id)
+        plants = paginate(request, Plant.objects.filter(owner=profile_user), PLANT_LIST_ORDERING, settings.PLANTS_PER_PAGE)
         return render(request, 'main/user_profile.html', {
             'profile_user': profile_user,
             'plants': plants
@@ -564,107 +678,17 @@ def add_permaplant(request):
             logger.info(f"Fetching plant details for PermaPeople ID: {permaplant_id}")
             
             plant_details = permapeople_api.get_plant(permaplant_id)
-            logger.info(f"Received plant details: {json.dumps(plant_details, indent=2)}")
+            logger.debug(f"Received plant details: {plant_details}")
             
             if not plant_details:
                 logger.error("Empty response from PermaPeople API")
                 return JsonResponse({'success': False, 'error': 'Could not fetch plant details'})
             
-            # Extract basic plant information
-            name = plant_details.get('name', '')
-            scientific_name = plant_details.get('scientific_name', '')
-            description = plant_details.get('description', '')
-            image_url = plant_details.get('image_url', '')
-            
-            if not name:
+            if not plant_details.get('name'):
                 logger.error("Missing required field: name")
                 return JsonResponse({'success': False, 'error': 'Missing required field: name'})
             
-            # Create the plant with empty plant_photo initially
-            plant = Plant.objects.create(
-                owner=request.user,
-                name=name,
-                scientific_name=scientific_name,
-                description=description,
-                plant_photo=None  # We'll handle the photo separately
-            )
-            logger.info(f"Created plant: ID={plant.id}, name={plant.name}")
-            
-            # If we have an image URL, upload it to Cloudinary
-            if image_url:
-                try:
-                    # Download the image from the URL
-                    import requests
-                    response = requests.get(image_url)
-                    if response.status_code == 200:
-                        # Upload to Cloudinary
-                        from cloudinary.uploader import upload
-                        from cloudinary.utils import cloudinary_url
-                        
-                        # Upload the image
-                        upload_result = upload(
-                            response.content,
-                            folder='plantbook/plants',
-                            public_id=f'plant_{plant.id}'
-                        )
-                        
-                        # Update the plant with the Cloudinary URL
-                        plant.plant_photo = upload_result['public_id']
-                        plant.save()
-                        logger.info(f"Successfully uploaded plant photo to Cloudinary: {plant.plant_photo}")
-                    else:
-                        logger.warning(f"Failed to download image from URL: {image_url}")
-                except Exception as e:
-                    logger.error(f"Error uploading plant photo to Cloudinary: {str(e)}")
-            
-            # Add description as a plant detail if it exists
-            if description:
-                try:
-                    PlantDetail.objects.create(
-                        plant=plant,
-                        header='Description',
-                        information=description
-                    )
-                    logger.debug("Added description as plant detail")
-                except Exception as e:
-                    logger.error(f"Error creating description detail: {str(e)}")
-            
-            # Process additional details
-            details = plant_details.get('data', [])
-            if not details:
-                logger.warning("No additional details found in response")
-                return JsonResponse({'success': True, 'plant_id': plant.id})
-            
-            details_added = 0
-            logger.info(f"Processing {len(details)} details")
-            
-            for detail in details:
-                if isinstance(detail, dict):
-                    key = detail.get('key', '').lower().replace(' ', '_')
-                    value = detail.get('value', '')
-                    
-                    logger.debug(f"Processing detail: key={key}, value={value}")
-                    
-                    # Skip empty values
-                    if not value:
-                        logger.debug(f"Skipping empty value for key: {key}")
-                        continue
-                    
-                    try:
-                        # Create plant detail
-                        plant_detail = PlantDetail.objects.create(
-                            plant=plant,
-                            header=key.replace('_', ' ').title(),
-                            information=value
-                        )
-                        details_added += 1
-                        logger.debug(f"Created plant detail: ID={plant_detail.id}, header={plant_detail.header}")
-                    except Exception as e:
-                        logger.error(f"Error creating plant detail: {str(e)}")
-                else:
-                    logger.warning(f"Invalid detail format: {detail}")
-            
-            logger.info(f"Successfully added {details_added} details to plant ID={plant.id}")
+            plant, details_added = create_plant_from_permapeople(request.user, plant_details)
             return JsonResponse({
                 'success': True, 
                 'plant_id': plant.id, 
@@ -672,15 +696,7 @@ def add_permaplant(request):
             })
             
         except Exception as e:
-            logger.error(f"Error fetching additional details: {str(e)}")
-            # If we have a plant object, return success with warning
-            if 'plant' in locals():
-                return JsonResponse({
-                    'success': True, 
-                    'plant_id': plant.id,
-                    'warning': f'Error fetching additional details: {str(e)}'
-                })
-            # If we don't have a plant object, return error
+            logger.error(f"Error adding PermaPeople plant {permaplant_id}: {str(e)}")
             return JsonResponse({
                 'success': False,
                 'error': f'Error fetching plant details: {str(e)}'
@@ -730,44 +746,9 @@ def import_permaplant(request):
                 logger.error(f"Unexpected API response format: {plant_details}")
                 return JsonResponse({'success': False, 'error': 'Unexpected API response format'})
             
-            # Extract data from key-value pairs
-            for item in plant_details['data']:
-                key = item.get('key', '').lower().replace(' ', '_')
-                value = item.get('value', '')
-                
-                # Skip empty values
-                if not value:
-                    continue
-                
-                # Check if detail already exists
-                existing_detail = PlantDetail.objects.filter(
-                    plant=plant,
-                    header=key.replace('_', ' ').title()
-                ).first()
-                
-                if existing_detail:
-                    # Update existing detail
-                    existing_detail.information = value
-                    existing_detail.save()
-                else:
-                    # Create new detail
-                    PlantDetail.objects.create(
-                        plant=plant,
-                        header=key.replace('_', ' ').title(),
-                        information=value
-                    )
-            
-            # Try to update source and external_id if they exist
-            try:
-                if hasattr(plant, 'source') and not plant.source:
-                    plant.source = 'permapeople'
-                if hasattr(plant, 'external_id') and not plant.external_id:
-                    plant.external_id = permaplant_id
-                plant.save()
-            except Exception as e:
-                logger.warning(f"Could not update source/external_id fields: {str(e)}")
+            updated, created = merge_permapeople_details(plant, plant_details)
             
-            return JsonResponse({'success': True})
+            return JsonResponse({'success': True, 'details_updated': updated, 'details_created': created})
             
         except json.JSONDecodeError as e:
             logger.error(f"JSON decode error: {str(e)}")
@@ -781,25 +762,64 @@ def import_permaplant(request):
         return JsonResponse({'success': False, 'error': str(e)})
 
 def permapeople_search(request):
-    """Search for plants using the PermaPeople API"""
+    """Search for plants using the PermaPeople API.
+
+    Cached results are rendered straight away; otherwise the page is
+    returned at once and fills itself from permapeople_search_stream.
+    """
     try:
         logger.info("Starting permapeople_search view")
         query = request.GET.get('q', '')
+        stream_url = None
         
         if query:
-            logger.info(f"Searching PermaPeople API with query: {query}")
-            plants = permapeople_api.search_plants(query)
-            logger.debug(f"Found {len(plants)} plants matching query: {query}")
+            plants = permapeople_api.cached_search(query)
+            if plants is None:
+                logger.info(f"Streaming PermaPeople results for query: {query}")
+                plants = []
+                stream_url = f"{reverse('main:permapeople_search_stream')}?{urlencode({'q': query})}"
+            else:
+                logger.debug(f"Found {len(plants)} cached plants matching query: {query}")
         else:
             plants = []
             logger.debug("No search query provided")
         
         return render(request, 'main/permapeople_search.html', {
             'plants': plants,
-            'query': query
+            'query': query,
+            'stream_url': stream_url,
         })
     except Exception as e:
         logger.error(f"Error in permapeople_search view: {str(e)}", exc_info=True)
         logger.error(f"Traceback: {traceback.format_exc()}")
         messages.error(request, 'An error occurred while searching the PermaPeople database.')
         return redirect('main:home')
+
+def _stream_search_results(query):
+    # A plain generator: gunicorn's sync workers send each line as it is
+    # yielded, where an async iterator would be buffered whole under WSGI.
+    # iter_search gives up PERMAPEOPLE_SEARCH_TIMEOUT seconds in, which bounds
+    # how long a stream holds the worker
+    results = permapeople_api.iter_search(query)
+    count = 0
+    try:
+        for plant in results:
+            count += 1
+            html = render_to_string('main/permapeople_result.html', {'plant': plant})
+            yield json.dumps({'id': plant.get('id'), 'html': html}) + '\n'
+        yield json.dumps({'done': True, 'count': count}) + '\n'
+    finally:
+        # The client went away: cancel the detail lookups still pending
+        results.close()
+
+def permapeople_search_stream(request):
+    """Stream PermaPeople search results as NDJSON, one plant per line as soon as its details resolve"""
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'error': 'Missing search query'}, status=400)
+    logger.info(f"Streaming PermaPeople search for query: {query}")
+    response = StreamingHttpResponse(_stream_search_results(query), content_type='application/x-ndjson')
+    response['Cache-Control'] = 'no-cache'
+    # Keep proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'plantbook.PlantBook.settings')
 
 application = get_wsgi_application()
+
+# Load the typeahead index in each worker before it takes requests
+from main.suggest import plant_suggestions  # noqa: E402
+
+plant_suggestions.warm_up()